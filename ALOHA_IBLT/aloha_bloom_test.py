@@ -4,7 +4,7 @@ from time import time
 from random import randint, seed
 from pympler import asizeof
 from IBLT.iblt import IBloomLT
-from aloha_iblt import IBLT
+from ALOHA_IBLT.aloha_iblt import IBLT
 from Random_IBLT.random_iblt import RIBLT
 
 
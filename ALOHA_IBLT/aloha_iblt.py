@@ -1,8 +1,11 @@
 # Created By Nick Huppert on 4/5/20.
-import mmh3
 import random
+from functools import lru_cache
+from IBLT.columnar_table import ColumnarTable
+from IBLT.hash_policy import cached_seed_list, decider_engine, default_hash_decider, generate_seed_list, DECIDER_TABLE
+from IBLT.sampling import inverse_cdf_sample, SAMPLER_INVERSE_CDF, SAMPLER_LEGACY, SAMPLERS
+from hashing import CHECKSUM_BYTES, KEY_ENCODING_STR
 import math
-from random import randint, seed
 
 
 class IBLT:
@@ -18,33 +21,29 @@ class IBLT:
     SEED_RANGE = 1000000
     MAX_HASHES = 15
     MAX_RANDOM_HASHES = 1000
+    PARAMETER_CACHE_SIZE = 128
     DEFAULT_A_VALUE = 0
+    # Seed lists are shared with the other randomized IBLT, see IBLT.hash_policy.
+    generate_seed_list = staticmethod(generate_seed_list)
+    cached_seed_list = staticmethod(cached_seed_list)
 
     @staticmethod
-    def generate_seed_list(seed_key, max_hashes=MAX_HASHES, seed_range=SEED_RANGE):
+    def hash_count_distribution(n_value, a_value):
         """
-        List of seeds to be used to derive the item locations.
+        ALOHA style distribution of the number of times an item is hashed to locations.
 
         Args:
-            seed_key: Shared key to instantiate hash functions.
-            max_hashes: Upper bound for total hashes to be used.
-            seed_range: Range of random numbers to be used to generate a new seed key if not specified.
+            n_value: Upper bound for total hashes to be used.
+            a_value: The value for a in the ALOHA style distribution function.
 
         Returns:
-            list[int]: A list of seed keys which are used to seed hash functions for item placement.
+            tuple[tuple[int], tuple[float]]: The hash counts and their cumulative weights.
         """
-        random.seed(seed_key)
-        seed_list = []
-        i = 0
-        while i < max_hashes:
-            chosen_seed = random.randint(0, seed_range)
-            if chosen_seed not in seed_list:
-                seed_list.append(chosen_seed)
-                i += 1
-        return seed_list
+        distribution_list = Distribution.create_aloha_style_distribution(a_value, n_value)
+        return tuple(value for value, weight in distribution_list), tuple(weight for value, weight in distribution_list)
 
     @staticmethod
-    def generate_hash_decider(seed_key, n_value, a_value, length=MAX_RANDOM_HASHES):
+    def generate_hash_decider(seed_key, n_value, a_value, length=MAX_RANDOM_HASHES, sampler=SAMPLER_LEGACY):
         """
         List of random numbers between min and max to decide how many times an item is hashed to locations.
 
@@ -53,15 +52,57 @@ class IBLT:
             seed_key: Shared key to instantiate hash functions.
             n_value: Upper bound for total hashes to be used.
             length: Size of list of random numbers to be generated.
+            sampler: SAMPLER_LEGACY or SAMPLER_INVERSE_CDF, see Distribution.create_randomly_generated_sequence.
 
         Returns:
             list[int]: A list of random numbers which decide how many times an item is hashed to be placed into IBLT.
         """
-        return Distribution.create_randomly_generated_sequence(length, n_value, a_value, seed_key)
+        return Distribution.create_randomly_generated_sequence(length, n_value, a_value, seed_key, sampler)
+
+    @staticmethod
+    @lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+    def cached_hash_decider(seed_key, n_value, a_value, length=MAX_RANDOM_HASHES, sampler=SAMPLER_LEGACY):
+        """
+        Hash decider of generate_hash_decider as an immutable tuple, kept in a process wide LRU cache keyed by the
+        arguments. Hits and misses are reported by cached_hash_decider.cache_info().
+
+        Args:
+            seed_key: Shared key to instantiate hash functions.
+            n_value: Upper bound for total hashes to be used.
+            a_value: The value for a in the ALOHA style distribution function.
+            length: Size of list of random numbers to be generated.
+            sampler: SAMPLER_LEGACY or SAMPLER_INVERSE_CDF, see Distribution.create_randomly_generated_sequence.
+
+        Returns:
+            tuple[int]: The numbers which decide how many times an item is hashed to be placed into IBLT.
+        """
+        return tuple(IBLT.generate_hash_decider(seed_key, n_value, a_value, length, sampler))
+
+    @staticmethod
+    def _default_hash_decider(seed_key, n_value, a_value, length, decider_mode, sampler=SAMPLER_LEGACY):
+        """
+        Hash decider used when none is passed in, see default_hash_decider.
+
+        Args:
+            seed_key: Shared key to instantiate hash functions.
+            n_value: Upper bound for total hashes to be used.
+            a_value: The value for a in the ALOHA style distribution function.
+            length: Size of the list of random numbers determining the amount of times an item is added.
+            decider_mode: DECIDER_TABLE or DECIDER_THRESHOLD.
+            sampler: SAMPLER_LEGACY or SAMPLER_INVERSE_CDF to draw the hash decider list in DECIDER_TABLE mode.
+
+        Returns:
+            tuple[int], ThresholdDecider: The hash decider.
+        """
+        return default_hash_decider(decider_mode, IBLT.hash_count_distribution(n_value, a_value),
+                                    lambda: IBLT.cached_hash_decider(seed_key, n_value, a_value, length, sampler))
 
     @staticmethod
     def generate_table(item_ids, seed_key, table_size=_M, max_hashes=MAX_HASHES, a_value=DEFAULT_A_VALUE,
-                       hash_decider=None, hash_decider_length=MAX_RANDOM_HASHES, seed_range=MAX_RANDOM_HASHES):
+                       hash_decider=None, hash_decider_length=MAX_RANDOM_HASHES, seed_range=MAX_RANDOM_HASHES,
+                       key_encoding=KEY_ENCODING_STR, checksum_bytes=CHECKSUM_BYTES, columnar=False,
+                       decider_mode=DECIDER_TABLE, sampler=SAMPLER_LEGACY, id_words=ColumnarTable.DEFAULT_ID_WORDS,
+                       distinct_cells=False):
         """
         Generate the randomized hash function quantity based IBLT
 
@@ -74,39 +115,81 @@ class IBLT:
             hash_decider(list[int]): List of random numbers for hashing iterations.
             hash_decider_length: Size of the list of random numbers determining the amount of times an item is added.
             seed_range: The upper bound of the values of any given seed key.
+            key_encoding: KEY_ENCODING_STR to hash the string of every ID, KEY_ENCODING_TYPED to hash integer IDs
+                as fixed width bytes.
+            checksum_bytes: Width in bytes of the hashSum checksum, narrower checksums make smaller tables.
+            columnar: Build a ColumnarTable backed by NumPy arrays instead of a list.
+            decider_mode: DECIDER_TABLE to build a hash decider list when none is passed in, DECIDER_THRESHOLD to
+                map every item hash straight onto a hash count with a ThresholdDecider.
+            sampler: SAMPLER_LEGACY or SAMPLER_INVERSE_CDF to draw the hash decider list, the inverse CDF sampler
+                builds long lists far faster but gives different lists for the same seed key.
+            id_words: Number of 64 bit words per idSum of a ColumnarTable, 1 for IDs below 2^64.
+            distinct_cells: Insert every item into each of its cells once, an item whose cells repeat then
+                occupies fewer cells than its hash count. Changes the tables of such items, see distinct_indices.
 
         Returns:
-            tuple[list[tuple], list[int], list[int]]: An IBLT as a list of tuples, each element is of the form (idSum, hashSum, count).
+            tuple[list[tuple], tuple[int], tuple[int]]: An IBLT as a list of tuples, each element is of the form
+                (idSum, hashSum, count), the cached seed list and the hash decider, a ThresholdDecider in
+                DECIDER_THRESHOLD mode.
         """
-        bloom = [(0, 0, 0)] * table_size
         if hash_decider is None:
-            hash_decider = IBLT.generate_hash_decider(seed_key, max_hashes, a_value, hash_decider_length)
-        seed_list = IBLT.generate_seed_list(seed_key, max_hashes, seed_range)
-        for item in item_ids:
-            item_hash = mmh3.hash128(str(item).encode(), seed_key)
-
-            hash_quantity = hash_decider[item_hash % len(hash_decider)]
-            hash_values = []
-            # Calculate hash values for the item and derive the index for encoding
-            for i in range(hash_quantity):
-                hash_values.append(mmh3.hash128(str(item).encode(), seed_list[i]))
-            for hash_value in hash_values:
-                index = hash_value % table_size
-                id_sum = bloom[index][0] ^ item
-                if bloom[index][1] == 0:
-                    hash_sum = item_hash
-                else:
-                    hash_sum = bloom[index][1] ^ item_hash
-                count = bloom[index][2] + 1
-                bloom[index] = (id_sum, hash_sum, count)
+            hash_decider = IBLT._default_hash_decider(seed_key, max_hashes, a_value, hash_decider_length, decider_mode,
+                                                      sampler)
+        seed_list = cached_seed_list(seed_key, max_hashes, seed_range)
+        engine = decider_engine(seed_key, seed_list, hash_decider, key_encoding, checksum_bytes, distinct_cells)
+        bloom = engine.encode(item_ids, table_size, columnar, id_words)
+        return bloom, seed_list, hash_decider
+
+    @staticmethod
+    def generate_table_parallel(item_ids, seed_key, table_size=_M, max_hashes=MAX_HASHES, a_value=DEFAULT_A_VALUE,
+                                hash_decider=None, hash_decider_length=MAX_RANDOM_HASHES, seed_range=MAX_RANDOM_HASHES,
+                                key_encoding=KEY_ENCODING_STR, checksum_bytes=CHECKSUM_BYTES, workers=None,
+                                decider_mode=DECIDER_TABLE, sampler=SAMPLER_LEGACY,
+                                id_words=ColumnarTable.DEFAULT_ID_WORDS, distinct_cells=False):
+        """
+        Generate the randomized hash function quantity based IBLT over a pool of worker processes.
+        Each worker encodes one shard of the IDs from shared memory into a columnar table and the partial
+        tables are merged.
+
+        Args:
+            item_ids: The non negative integer IDs below 2^64 of the items to be inserted.
+            seed_key: Shared key to instantiate hash functions.
+            table_size: Size of the IBLT.
+            a_value: The value for a in the ALOHA style distribution function.
+            max_hashes: Upper bound for total hashes to be used.
+            hash_decider(list[int]): List of random numbers for hashing iterations.
+            hash_decider_length: Size of the list of random numbers determining the amount of times an item is added.
+            seed_range: The upper bound of the values of any given seed key.
+            key_encoding: KEY_ENCODING_STR to hash the string of every ID, KEY_ENCODING_TYPED to hash integer IDs
+                as fixed width bytes.
+            checksum_bytes: Width in bytes of the hashSum checksum, narrower checksums make smaller tables.
+            workers: Number of worker processes, defaults to the number of CPUs.
+            decider_mode: DECIDER_TABLE or DECIDER_THRESHOLD, see generate_table.
+            sampler: SAMPLER_LEGACY or SAMPLER_INVERSE_CDF, see generate_table.
+            id_words: Number of 64 bit words per idSum, see generate_table.
+            distinct_cells: Insert every item into each of its cells once, see generate_table.
+
+        Returns:
+            tuple[ColumnarTable, tuple[int], tuple[int]]:
+                The IBLT backed by NumPy arrays, the seed list and the hash decider.
+        """
+        if hash_decider is None:
+            hash_decider = IBLT._default_hash_decider(seed_key, max_hashes, a_value, hash_decider_length, decider_mode,
+                                                      sampler)
+        seed_list = cached_seed_list(seed_key, max_hashes, seed_range)
+        engine = decider_engine(seed_key, seed_list, hash_decider, key_encoding, checksum_bytes, distinct_cells)
+        bloom = engine.encode_parallel(item_ids, table_size, workers, id_words)
         return bloom, seed_list, hash_decider
 
     @staticmethod
     def compare_tables(table1, table2, seed_key, seed_list=None, hash_decider=None,
                        max_hashes=MAX_HASHES, a_value=DEFAULT_A_VALUE, hash_decider_length=MAX_RANDOM_HASHES,
-                       seed_range=MAX_RANDOM_HASHES):
+                       seed_range=MAX_RANDOM_HASHES, key_encoding=KEY_ENCODING_STR,
+                       checksum_bytes=CHECKSUM_BYTES, decider_mode=DECIDER_TABLE, sampler=SAMPLER_LEGACY,
+                       distinct_cells=False):
         """
         Compares 2 IBLTs and attempts to return the symmetric difference.
+        Two ColumnarTables are subtracted with vectorized operations and decoded in columnar format.
         Args:
             a_value: The value for a in the ALOHA style distribution function.
             table1: Invertible bloom filter 1
@@ -117,103 +200,60 @@ class IBLT:
             max_hashes: Upper bound for total hashes to be used.
             hash_decider_length: Size of the list of random numbers determining the amount of times an item is added.
             seed_range: The upper bound of the values of any given seed key.
+            key_encoding: KEY_ENCODING_STR to hash the string of every ID, KEY_ENCODING_TYPED to hash integer IDs
+                as fixed width bytes.
+            checksum_bytes: Width in bytes of the hashSum checksum, narrower checksums make smaller tables.
+            decider_mode: DECIDER_TABLE or DECIDER_THRESHOLD, see generate_table.
+            sampler: SAMPLER_LEGACY or SAMPLER_INVERSE_CDF, see generate_table.
+            distinct_cells: Whether the tables were built with distinct_cells, see generate_table.
 
         Returns:
-            tuple[list[tuple], list[tuple], str]:
+            DecodeResult:
                 The symmetric difference of the IBLTs, list 1 is the extra elements from filter 1,
                     list 2 is the extra elements from filter 2, and a string to confirm if the
-                    decoding was successful.
+                    decoding was successful, along with the residual cells left when decoding fails.
         """
-        # Check tables are equal size.
-        if len(table1) != len(table2):
-            return False
         # Generate hash decider or seed list from default values if none are passed in.
         if hash_decider is None:
-            hash_decider = IBLT.generate_hash_decider(seed_key, max_hashes, a_value, hash_decider_length)
+            hash_decider = IBLT._default_hash_decider(seed_key, max_hashes, a_value, hash_decider_length, decider_mode,
+                                                      sampler)
         if seed_list is None:
-            seed_list = IBLT.generate_seed_list(seed_key, max_hashes, seed_range)
-        # Create lists for differences and a list to decode.
-        table_size = len(table1)
-        table1_differences = []
-        table2_differences = []
-        table3 = [[0, 0, 0]] * table_size
-        # Generate symmetric difference table
-        for index in range(table_size):
-            id_sum = table1[index][0] ^ table2[index][0]
-            hash_sum = table1[index][1] ^ table2[index][1]
-            count = table1[index][2] - table2[index][2]
-            table3[index] = [id_sum, hash_sum, count]
-        # Begin decoding table
-        decodable = True
-        while decodable is True:
-            decodable = False
-            for index in range(table_size):
-                element = table3[index]
-                # Check that the count for an element is 1 or -1.
-                if element[2] == 1 or element[2] == -1:
-                    # Ensure that the hash of the item ID is equal to the value stored in the table.
-                    element_hash = mmh3.hash128(str(element[0]).encode(), seed_key)
-                    # If they match, we have a decodable item, now derive which table this element exists
-                    # in and remove accordingly.
-                    if element_hash == element[1]:
-                        table3 = IBLT.peel_element(element[0], seed_key, table3, element[2], seed_list, hash_decider)
-                        decodable = True
-                        # Add decoded element to appropriate table based on which IBLT it existed in.
-                        if element[2] == 1:
-                            table1_differences.append(element)
-                        else:
-                            table2_differences.append(element)
-        success = "Success"
-        # Scan list to ensure all elements have been decoded.
-        for index in range(table_size):
-            if table3[index][1] != 0:
-                success = "Failed"
-                break
-        # print("ALOHA: %s" % success)
-        return table1_differences, table2_differences, success
+            seed_list = cached_seed_list(seed_key, max_hashes, seed_range)
+        engine = decider_engine(seed_key, seed_list, hash_decider, key_encoding, checksum_bytes, distinct_cells)
+        return engine.decode(table1, table2)
 
     @staticmethod
-    def peel_element(element_id, seed_key, table, alteration, seed_list, hash_decider):
+    def peel_element(element_id, seed_key, table, alteration, seed_list, hash_decider, key_encoding=KEY_ENCODING_STR,
+                     checksum_bytes=CHECKSUM_BYTES, distinct_cells=False):
         """
         Peels a single element from a given IBLT.
         
         Args:
             element_id(int): The element to be peeled.
             seed_key: Shared key to instantiate hash functions.
-            table(list): The invertible bloom lookup table.
+            table(list, ColumnarTable): The invertible bloom lookup table.
             alteration(int): The indicator as to which list this element was stored in (1 OR -1)
             seed_list: List of seed keys for hashing item ids.
-            hash_decider: List of random numbers for hashing iterations.
+            hash_decider: List of random numbers for hashing iterations or a ThresholdDecider.
+            key_encoding: KEY_ENCODING_STR to hash the string of every ID, KEY_ENCODING_TYPED to hash integer IDs
+                as fixed width bytes.
+            checksum_bytes: Width in bytes of the hashSum checksum, narrower checksums make smaller tables.
+            distinct_cells: Whether the table was built with distinct_cells, see generate_table.
 
         Returns:
             list[tuple]:
                 An updated invertible bloom lookup table with the given element removed.
         """
-        # Get initial hash values of element id.
-        item_hash = mmh3.hash128(str(element_id).encode(), seed_key)
-        hash_values = []
-        # Derive how many times the element has been inserted into the IBLT.
-        hash_quantity = hash_decider[item_hash % len(hash_decider)]
-        # Generate the list of hashes for the elements positions.
-        for i in range(hash_quantity):
-            hash_values.append(mmh3.hash128(str(element_id).encode(), seed_list[i]))
-        # Remove the element from each index in the table, altering the count field based
-        # on the table it came from.
-        for hash_value in hash_values:
-            index = hash_value % len(table)
-            id_sum = table[index][0] ^ element_id
-            if table[index][1] == 0:
-                hash_sum = item_hash
-            else:
-                hash_sum = table[index][1] ^ item_hash
-            count = table[index][2] - alteration
-            table[index] = (id_sum, hash_sum, count)
-        return table
+        engine = decider_engine(seed_key, seed_list, hash_decider, key_encoding, checksum_bytes, distinct_cells)
+        return engine.peel(element_id, table, alteration)
 
 
 class Distribution:
 
     MAXIMUM_ACCURACY = 10000000
+    SAMPLER_LEGACY = SAMPLER_LEGACY
+    SAMPLER_INVERSE_CDF = SAMPLER_INVERSE_CDF
+    SAMPLERS = SAMPLERS
 
     @staticmethod
     def create_aloha_style_distribution(a, n):
@@ -241,24 +281,33 @@ class Distribution:
         return distributions
 
     @staticmethod
-    def create_randomly_generated_sequence(size, n_value, a_value, seed_value):
+    def create_randomly_generated_sequence(size, n_value, a_value, seed_value, sampler=SAMPLER_LEGACY):
         """
         Creates a sequence of numbers between 2 and N with weightings based on the ALOHA distribution.
+        SAMPLER_LEGACY draws every number with randint and scans the distribution, reproducing earlier sequences.
+        SAMPLER_INVERSE_CDF draws the whole sequence at once with binary searches over a NumPy Generator, it is
+        deterministic for a seed but gives different sequences to the legacy sampler.
 
         Args:
             size: The length of the list of values.
             n_value: The subset of M where n is the most hash functions.
             a_value: The weighting for the ALOHA distribution.
             seed_value: The seed key used across IBLTs to ensure randomized results are predictable.
+            sampler: SAMPLER_LEGACY or SAMPLER_INVERSE_CDF, the inverse CDF sampler needs a non negative integer seed.
 
         Returns:
-
+            list[int]: The sequence of numbers.
         """
         distribution_list = Distribution.create_aloha_style_distribution(a_value, n_value)
-        seed(seed_value)
+        if sampler == Distribution.SAMPLER_INVERSE_CDF:
+            return inverse_cdf_sample([value for value, weight in distribution_list],
+                                      [weight for value, weight in distribution_list], size, seed_value)
+        if sampler != Distribution.SAMPLER_LEGACY:
+            raise ValueError("Unknown sampler %s, expected one of %s" % (sampler, Distribution.SAMPLERS))
+        rng = random.Random(seed_value)
         hash_list = []
         for i in range(0, size):
-            random_number = randint(0, Distribution.MAXIMUM_ACCURACY)
+            random_number = rng.randint(0, Distribution.MAXIMUM_ACCURACY)
             random_number = random_number/Distribution.MAXIMUM_ACCURACY
             for j in range(0, len(distribution_list)):
                 if random_number <= distribution_list[j][1]:
@@ -1,7 +1,7 @@
 # Created By Nick Huppert on 20/7/20.
 import math
 from random import randint, seed
-from aloha_iblt import Distribution
+from ALOHA_IBLT.aloha_iblt import Distribution
 
 
 if __name__ == "__main__":
@@ -0,0 +1,314 @@
+import numpy as np
+
+# Number of set bits in every byte value.
+_BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+class BitArray:
+    """
+    Bit-packed array of binary values used as the backing store for bloom filters.
+    Bits are stored 8 per byte, bit i lives in byte i // 8 at position i % 8 (least significant bit first).
+    """
+    COUNT_CHUNK_BYTES = 1 << 20
+
+    def __init__(self, size, data=None):
+        """
+        Constructor
+
+        Args:
+            size(int): Number of bits held by the array.
+            data(bytes, bytearray, memoryview): (Optional) Packed bytes to wrap instead of allocating a new buffer.
+        """
+        self.size = int(size)
+        if data is None:
+            data = bytearray(self.byte_length(self.size))
+        elif len(data) != self.byte_length(self.size):
+            raise ValueError("Expected %s bytes for %s bits, got %s" % (self.byte_length(self.size), self.size,
+                                                                         len(data)))
+        self.data = data
+
+    @staticmethod
+    def byte_length(size):
+        """
+        Number of bytes required to store a given number of bits.
+
+        Args:
+            size(int): Number of bits.
+
+        Returns:
+            int: Number of bytes required.
+        """
+        return (int(size) + 7) >> 3
+
+    def set_bit(self, index):
+        """
+        Sets a single bit to 1.
+
+        Args:
+            index(int): Position of the bit, 0 <= index < size.
+        """
+        self.data[index >> 3] |= 1 << (index & 7)
+
+    def test_bit(self, index):
+        """
+        Checks whether a single bit is set.
+
+        Args:
+            index(int): Position of the bit, 0 <= index < size.
+
+        Returns:
+            bool: True if the bit is 1.
+        """
+        return (self.data[index >> 3] >> (index & 7)) & 1 == 1
+
+    def set_bits(self, indices):
+        """
+        Sets every bit in the given positions to 1.
+
+        Args:
+            indices(iterable[int]): Positions of the bits to set.
+        """
+        data = self.data
+        for index in indices:
+            data[index >> 3] |= 1 << (index & 7)
+
+    def test_bits(self, indices):
+        """
+        Checks that every bit in the given positions is set, stopping at the first unset bit.
+
+        Args:
+            indices(iterable[int]): Positions of the bits to check.
+
+        Returns:
+            bool: True if all bits are 1.
+        """
+        data = self.data
+        for index in indices:
+            if not (data[index >> 3] >> (index & 7)) & 1:
+                return False
+        return True
+
+    def gather(self, indices):
+        """
+        Reads the bits at an array of positions in one vectorized operation.
+
+        Args:
+            indices(numpy.ndarray): Unsigned integer array of bit positions, 0 <= index < size.
+
+        Returns:
+            numpy.ndarray: An array of the same shape holding 1 where the bit is set and 0 otherwise.
+        """
+        bits = np.frombuffer(self.data, dtype=np.uint8)
+        return (bits[indices >> 3] >> (indices & 7).astype(np.uint8)) & 1
+
+    def _words(self):
+        """
+        Views the packed bytes as 64 bit words when the length allows it, otherwise as single bytes.
+
+        Returns:
+            numpy.ndarray: The data of the bit array without copying.
+        """
+        data = np.frombuffer(self.data, dtype=np.uint8)
+        if len(data) % 8 == 0:
+            return data.view(np.uint64)
+        return data
+
+    def bitwise_or(self, other):
+        """
+        Combines two bit arrays of the same size word by word, a bit is set if it is set in either.
+
+        Args:
+            other(BitArray): The bit array to combine with.
+
+        Returns:
+            BitArray: A new bit array holding the union.
+        """
+        if self.size != other.size:
+            raise ValueError("Cannot combine bit arrays of %s and %s bits" % (self.size, other.size))
+        return BitArray(self.size, bytearray(np.bitwise_or(self._words(), other._words()).tobytes()))
+
+    def bitwise_and(self, other):
+        """
+        Combines two bit arrays of the same size word by word, a bit is set if it is set in both.
+
+        Args:
+            other(BitArray): The bit array to combine with.
+
+        Returns:
+            BitArray: A new bit array holding the intersection.
+        """
+        if self.size != other.size:
+            raise ValueError("Cannot combine bit arrays of %s and %s bits" % (self.size, other.size))
+        return BitArray(self.size, bytearray(np.bitwise_and(self._words(), other._words()).tobytes()))
+
+    def count(self):
+        """
+        Counts the set bits in the array.
+        Bytes are looked up in a table of bit counts a chunk at a time, so the bits are never unpacked.
+
+        Returns:
+            int: The number of bits set to 1.
+        """
+        data = np.frombuffer(self.data, dtype=np.uint8)
+        total = 0
+        for start in range(0, len(data), self.COUNT_CHUNK_BYTES):
+            total += int(_BYTE_POPCOUNT[data[start:start + self.COUNT_CHUNK_BYTES]].sum(dtype=np.int64))
+        return total
+
+    @classmethod
+    def from_legacy(cls, legacy_filter):
+        """
+        Packs a legacy byte-per-bit bloom filter into a bit array.
+
+        Args:
+            legacy_filter(bytearray): Filter storing one whole byte per bit, any non zero byte is a set bit.
+
+        Returns:
+            BitArray: The packed equivalent of the filter.
+        """
+        bits = np.asarray(legacy_filter) != 0
+        return cls(len(bits), bytearray(np.packbits(bits, bitorder="little").tobytes()))
+
+    def to_legacy(self):
+        """
+        Unpacks the bit array into the legacy byte-per-bit layout.
+
+        Returns:
+            bytearray: Filter storing one whole byte per bit.
+        """
+        bits = np.unpackbits(np.frombuffer(self.data, dtype=np.uint8), count=self.size, bitorder="little")
+        return bytearray(bits.tobytes())
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("BitArray index out of range")
+        return (self.data[index >> 3] >> (index & 7)) & 1
+
+    def __setitem__(self, index, value):
+        if not 0 <= index < self.size:
+            raise IndexError("BitArray index out of range")
+        if value:
+            self.data[index >> 3] |= 1 << (index & 7)
+        else:
+            self.data[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def __eq__(self, other):
+        if not isinstance(other, BitArray):
+            return NotImplemented
+        return self.size == other.size and bytes(self.data) == bytes(other.data)
+
+
+class CounterArray:
+    """
+    Array of 4 bit saturating counters used as the backing store for counting bloom filters.
+    Counters are stored 2 per byte, counter i lives in byte i // 2, in the low nibble for even i.
+    A counter which reaches MAX_COUNT stays there, it can no longer tell how many items share it.
+    """
+    MAX_COUNT = 15
+
+    def __init__(self, size, data=None):
+        """
+        Constructor
+
+        Args:
+            size(int): Number of counters held by the array.
+            data(bytes, bytearray, memoryview): (Optional) Packed bytes to wrap instead of allocating a new buffer.
+        """
+        self.size = int(size)
+        if data is None:
+            data = bytearray(self.byte_length(self.size))
+        elif len(data) != self.byte_length(self.size):
+            raise ValueError("Expected %s bytes for %s counters, got %s" % (self.byte_length(self.size), self.size,
+                                                                             len(data)))
+        self.data = data
+
+    @staticmethod
+    def byte_length(size):
+        """
+        Number of bytes required to store a given number of counters.
+
+        Args:
+            size(int): Number of counters.
+
+        Returns:
+            int: Number of bytes required.
+        """
+        return (int(size) + 1) >> 1
+
+    def increment(self, index):
+        """
+        Adds one to a counter unless it is saturated.
+
+        Args:
+            index(int): Position of the counter, 0 <= index < size.
+        """
+        shift = (index & 1) << 2
+        if (self.data[index >> 1] >> shift) & 0xF < self.MAX_COUNT:
+            self.data[index >> 1] += 1 << shift
+
+    def decrement(self, index):
+        """
+        Subtracts one from a counter unless it is empty or saturated.
+
+        Args:
+            index(int): Position of the counter, 0 <= index < size.
+        """
+        shift = (index & 1) << 2
+        value = (self.data[index >> 1] >> shift) & 0xF
+        if 0 < value < self.MAX_COUNT:
+            self.data[index >> 1] -= 1 << shift
+
+    def test_bits(self, indices):
+        """
+        Checks that every counter in the given positions is non zero, stopping at the first empty counter.
+
+        Args:
+            indices(iterable[int]): Positions of the counters to check.
+
+        Returns:
+            bool: True if all counters are non zero.
+        """
+        data = self.data
+        for index in indices:
+            if not (data[index >> 1] >> ((index & 1) << 2)) & 0xF:
+                return False
+        return True
+
+    def gather(self, indices):
+        """
+        Reads the counters at an array of positions in one vectorized operation.
+
+        Args:
+            indices(numpy.ndarray): Unsigned integer array of counter positions, 0 <= index < size.
+
+        Returns:
+            numpy.ndarray: An array of the same shape holding the counter values.
+        """
+        counters = np.frombuffer(self.data, dtype=np.uint8)
+        return (counters[indices >> 1] >> ((indices & 1) << 2).astype(np.uint8)) & 0xF
+
+    def count(self):
+        """
+        Counts the non zero counters in the array.
+
+        Returns:
+            int: The number of counters above 0.
+        """
+        counters = np.frombuffer(self.data, dtype=np.uint8)
+        return int(np.count_nonzero(counters & 0xF) + np.count_nonzero(counters >> 4))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("CounterArray index out of range")
+        return (self.data[index >> 1] >> ((index & 1) << 2)) & 0xF
+
+    def __eq__(self, other):
+        if not isinstance(other, CounterArray):
+            return NotImplemented
+        return self.size == other.size and bytes(self.data) == bytes(other.data)
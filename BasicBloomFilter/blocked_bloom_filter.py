@@ -0,0 +1,91 @@
+import mmh3
+import math
+from BasicBloomFilter.bloom_filter import BloomFilter
+from hashing import HASH_MODE_SEEDED, HASH_MODE_DOUBLE, HASH_MODE_PARTITIONED, KEY_ENCODING_STR
+
+_LOW_32_MASK = (1 << 32) - 1
+
+
+class BlockedBloomFilter(BloomFilter):
+    """
+    Blocked bloom filter, each item is mapped to a single 512 bit block (one cache line) and all k bits
+    for the item are set within that block. The size of the filter is rounded up to a whole number of blocks.
+    """
+    BLOCK_SIZE = 512
+    FILTER_TYPE = 1
+
+    def __init__(self, m=BloomFilter._M, k=BloomFilter._K, legacy_layout=False, hash_mode=HASH_MODE_SEEDED,
+                 key_encoding=KEY_ENCODING_STR):
+        """
+        Constructor
+
+        Args:
+            m(int): Size of bloom filter array, rounded up to a multiple of BLOCK_SIZE.
+            k(int): Number of unique hashing algorithms to use.
+            legacy_layout(bool): (Optional) Generate filters storing one byte per bit instead of packed bits.
+            hash_mode(str): (Optional) HASH_MODE_SEEDED to hash once per seed, HASH_MODE_DOUBLE to derive
+                all k bits from a single hash.
+            key_encoding(str): (Optional) KEY_ENCODING_STR to hash the string of every item, KEY_ENCODING_TYPED
+                to hash integers and bytes directly.
+        """
+        if hash_mode == HASH_MODE_PARTITIONED:
+            raise ValueError("Blocked bloom filters hash within a single block and cannot be partitioned")
+        blocks = max(1, int(math.ceil(m / self.BLOCK_SIZE)))
+        super().__init__(blocks * self.BLOCK_SIZE, k, legacy_layout, hash_mode, key_encoding)
+
+    def _indices(self, key, seeds, m):
+        """
+        Derives the filter indices for an encoded item, all within one block.
+        The block is chosen from the upper 64 bits of the first hash, the bit offsets inside the block
+        come from the lower bits.
+
+        Args:
+            key(bytes): The encoded item.
+            seeds(list): A list of k seeds for the hashing algorithm.
+            m(int): Size of bloom filter array.
+
+        Returns:
+            list[int]: The k indices of the item in the filter.
+        """
+        if len(seeds) == 0:
+            return []
+        block_size = min(self.BLOCK_SIZE, m)
+        block_hash = mmh3.hash128(key, seeds[0])
+        block_start = ((block_hash >> 64) % (m // block_size)) * block_size
+        if self.hash_mode == HASH_MODE_DOUBLE:
+            h1 = block_hash & _LOW_32_MASK
+            h2 = ((block_hash >> 32) & _LOW_32_MASK) | 1
+            return [block_start + (h1 + i * h2) % block_size for i in range(len(seeds))]
+        offsets = [block_hash % block_size]
+        for seed in seeds[1:]:
+            offsets.append(mmh3.hash128(key, seed) % block_size)
+        return [block_start + offset for offset in offsets]
+
+    @staticmethod
+    def calculate_approximate_blocked_false_positive_rate(array_size, element_quantity, number_of_hashes,
+                                                          block_size=BLOCK_SIZE):
+        """
+        Calculates the approximate false positive rate for a given blocked bloom filter.
+        The number of elements landing in a block is Poisson distributed, the rate is the standard
+        bloom filter rate for one block weighted by the probability of each block load.
+
+        Args:
+            array_size(int): Size (m) of the bloom filter.
+            element_quantity(int): The quantity (n) of elements in bloom filter.
+            number_of_hashes(int): The number of hash functions (k).
+            block_size(int): (Optional) Size of a single block in bits.
+
+        Returns:
+            float: The probability of false positives (f) for given values. 1 >= f >= 0.
+        """
+        block_size = min(block_size, array_size)
+        mean_load = element_quantity * block_size / array_size
+        if mean_load == 0:
+            return 0.0
+        upper_bound = int(mean_load + 10 * math.sqrt(mean_load) + 10)
+        rate = 0.0
+        for load in range(1, upper_bound + 1):
+            probability = math.exp(load * math.log(mean_load) - mean_load - math.lgamma(load + 1))
+            rate += probability * BloomFilter.calculate_approximate_false_positive_rate(block_size, load,
+                                                                                        number_of_hashes)
+        return rate
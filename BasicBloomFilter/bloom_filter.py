@@ -1,33 +1,128 @@
-import mmh3
 import random
 import math
+import mmap
+import struct
+import numpy as np
+from BasicBloomFilter.bit_array import BitArray
+from hashing import derive_indices, derive_index_array, encode_key, HASH_MODE_SEEDED, HASH_MODES, KEY_ENCODING_STR, KEY_ENCODINGS
 
 
 class BloomFilter:
     """
     Bloom Filter class, creates and verifies bloom filters for items.
+    Each object also owns a filter of its own which items can be added to incrementally.
     """
     _M = 500
     _K = 9
     SEED_RANGE = 1000000
+    FILTER_TYPE = 0
+    _STORAGE = BitArray
+    # Serialized header: magic, version, filter type, hash mode, key encoding, m, k. Followed by k uint32 seeds,
+    # padding to an 8 byte boundary and the packed bit array.
+    FILE_MAGIC = b"BLMF"
+    FILE_VERSION = 1
+    _HEADER = struct.Struct("<4sBBBBQI")
 
-    def __init__(self, m=_M, k=_K):
+    def __init__(self, m=_M, k=_K, legacy_layout=False, hash_mode=HASH_MODE_SEEDED, key_encoding=KEY_ENCODING_STR):
         """
         Constructor
 
         Args:
             m(int): Size of bloom filter array.
             k(int): Number of unique hashing algorithms to use.
+            legacy_layout(bool): (Optional) Generate filters storing one byte per bit instead of packed bits.
+            hash_mode(str): (Optional) HASH_MODE_SEEDED to hash once per seed, HASH_MODE_DOUBLE to derive
+                all k indices from a single hash.
+            key_encoding(str): (Optional) KEY_ENCODING_STR to hash the string of every item, KEY_ENCODING_TYPED
+                to hash integers and bytes directly.
         """
-        random.seed()
+        if hash_mode not in HASH_MODES:
+            raise ValueError("Unknown hash mode %s, expected one of %s" % (hash_mode, HASH_MODES))
+        if key_encoding not in KEY_ENCODINGS:
+            raise ValueError("Unknown key encoding %s, expected one of %s" % (key_encoding, KEY_ENCODINGS))
+        rng = random.Random()
         self.seed_list = []
         for i in range(k):
-            self.seed_list.append(random.randint(0, self.SEED_RANGE))
+            self.seed_list.append(rng.randint(0, self.SEED_RANGE))
         self.m = m
+        self.legacy_layout = legacy_layout
+        self.hash_mode = hash_mode
+        self.key_encoding = key_encoding
+        self.bit_array = self._new_filter(m)
+
+    def _indices(self, key, seeds, m):
+        """
+        Derives the filter indices for an encoded item.
+
+        Args:
+            key(bytes): The encoded item.
+            seeds(list): A list of k seeds for the hashing algorithm.
+            m(int): Size of bloom filter array.
+
+        Returns:
+            list[int]: The k indices of the item in the filter.
+        """
+        return derive_indices(key, seeds, m, self.hash_mode)
+
+    def _new_filter(self, m):
+        """
+        Allocates an empty bloom filter array in the layout used by this filter.
+
+        Args:
+            m(int): Size of bloom filter array.
+
+        Returns:
+            BitArray, bytearray: An empty bloom filter.
+        """
+        if self.legacy_layout:
+            return bytearray(int(m))
+        return self._STORAGE(m)
+
+    def _insert(self, bloom_filter, items, seeds, m):
+        """
+        Inserts items into an existing bloom filter array.
+
+        Args:
+            bloom_filter(BitArray, bytearray): The array of binary values representing the bloom filter.
+            items(iterable, dict): The items to be inserted, dictionaries are inserted as key:value pairs.
+            seeds(list): A list of k seeds for the hashing algorithm.
+            m(int): Size of bloom filter array.
+        """
+        if type(items) == dict:
+            items = [str(key) + ":" + str(value) for key, value in items.items()]
+        if isinstance(bloom_filter, self._STORAGE):
+            for item in items:
+                bloom_filter.set_bits(self._indices(encode_key(item, self.key_encoding), seeds, m))
+        else:
+            for item in items:
+                for index in self._indices(encode_key(item, self.key_encoding), seeds, m):
+                    bloom_filter[index] = 1
+
+    def add(self, item):
+        """
+        Inserts a single item into the filter owned by this object.
+
+        Args:
+            item: The item to be inserted, a dictionary is inserted as key:value pairs.
+        """
+        self._insert(self.bit_array, item if type(item) == dict else [item], self.seed_list, self.m)
+
+    def add_many(self, items):
+        """
+        Inserts a number of items into the filter owned by this object.
+
+        Args:
+            items(iterable, dict): The items to be inserted, a dictionary is inserted as key:value pairs.
+        """
+        self._insert(self.bit_array, items, self.seed_list, self.m)
+
+    def __contains__(self, item):
+        return self.verify_item(item, self.bit_array)
 
     def generate_filter(self, items, seeds=None, m=None):
         """
-        Given a number of items, generate a bloom filter.
+        Given a number of items, generate a new bloom filter.
+        The filter owned by this object is left untouched.
 
         Args:
             items(list, dict): A list of items or a single item to be inserted to the filter.
@@ -35,34 +130,27 @@ class BloomFilter:
             m(int): (Optional) Size of bloom filter array.
 
         Returns:
-            bytearray: An array of binary bits representing the bloom filter.
+            BitArray, bytearray: An array of binary bits representing the bloom filter, a bytearray
+                with one byte per bit if the filter uses the legacy layout.
 
         """
-        if type(items) == dict:
-            keys = items.keys()
-            temp_list = []
-            for key in keys:
-                temp_string = str(key) + ":" + str(items[key])
-                temp_list.append(temp_string)
-            items = temp_list
-        bloom_filter = bytearray(int(self.m))
         if seeds is None:
             seeds = self.seed_list
         if m is None:
             m = self.m
-        for item in items:
-            for seed in seeds:
-                index = mmh3.hash128(str(item).encode(), seed) % m
-                bloom_filter[index] = 1
+        bloom_filter = self._new_filter(m)
+        self._insert(bloom_filter, items, seeds, m)
         return bloom_filter
 
-    def verify_item(self, item, bloom_filter, seeds=None, m=None):
+    def verify_item(self, item, bloom_filter=None, seeds=None, m=None):
         """
         Verifies if an item is present in the supplied bloom filter.
 
         Args:
             item: The item to be checked.
-            bloom_filter(bytearray): The array of binary values representing the bloom filter
+            bloom_filter(BitArray, bytearray): (Optional) The array of binary values representing the bloom filter,
+                a bytearray is read as the legacy layout of one byte per bit. Defaults to the filter owned by
+                this object.
             seeds(list): A list of k seeds for the hashing algorithm.
             m(int): (Optional) Size of bloom filter array.
 
@@ -70,11 +158,12 @@ class BloomFilter:
             bool: If the item may be in the bloom filter or not.
         """
         verify_item = None
+        if bloom_filter is None:
+            bloom_filter = self.bit_array
         if seeds is None:
             seeds = self.seed_list
         if m is None:
             m = self.m
-        print(type(item))
         if type(item) == dict:
             if len(item) != 1:
                 return False
@@ -83,10 +172,13 @@ class BloomFilter:
                 verify_item = str(key) + ":" + str(item[key])
         else:
             verify_item = item
+        if isinstance(bloom_filter, self._STORAGE):
+            if bloom_filter.size < m:
+                return False
+            return bloom_filter.test_bits(self._indices(encode_key(verify_item, self.key_encoding), seeds, m))
         verify = True
         try:
-            for seed in seeds:
-                index = mmh3.hash128(str(verify_item).encode(), seed) % m
+            for index in self._indices(encode_key(verify_item, self.key_encoding), seeds, m):
                 if bloom_filter[index] == 0:
                     verify = False
                     break
@@ -95,6 +187,257 @@ class BloomFilter:
         finally:
             return verify
 
+    def verify_many(self, items, bloom_filter=None, seeds=None, m=None):
+        """
+        Verifies a batch of items against the supplied bloom filter in one pass.
+        Every item is encoded once, the bit indices for the whole batch are derived into a single
+        array by derive_index_array and tested together.
+
+        Args:
+            items(list): The items to be checked, single entry dictionaries are checked as key:value pairs.
+            bloom_filter(BitArray, bytearray): (Optional) The array of binary values representing the bloom filter,
+                a bytearray is read as the legacy layout of one byte per bit. Defaults to the filter owned by
+                this object.
+            seeds(list): (Optional) A list of k seeds for the hashing algorithm.
+            m(int): (Optional) Size of bloom filter array.
+
+        Returns:
+            numpy.ndarray: A boolean vector, True where the item may be in the bloom filter.
+        """
+        if bloom_filter is None:
+            bloom_filter = self.bit_array
+        if seeds is None:
+            seeds = self.seed_list
+        if m is None:
+            m = self.m
+        items = list(items)
+        valid = np.ones(len(items), dtype=bool)
+        keys = []
+        for position, item in enumerate(items):
+            if type(item) == dict:
+                if len(item) != 1:
+                    valid[position] = False
+                    keys.append(b"")
+                    continue
+                key, value = next(iter(item.items()))
+                item = str(key) + ":" + str(value)
+            keys.append(encode_key(item, self.key_encoding))
+        if len(keys) == 0 or len(seeds) == 0:
+            return valid
+        if type(self)._indices is BloomFilter._indices:
+            indices = derive_index_array(keys, seeds, m, self.hash_mode)
+        else:
+            # Subclasses which place their indices differently, such as the blocked filter, are derived per item.
+            indices = np.array([self._indices(key, seeds, m) for key in keys], dtype=np.uint64)
+        size = len(bloom_filter)
+        if size == 0:
+            return np.zeros(len(items), dtype=bool)
+        # Indices past the end of a short filter are treated as unset, matching verify_item.
+        valid &= (indices < size).all(axis=1)
+        indices = np.minimum(indices, size - 1)
+        if isinstance(bloom_filter, self._STORAGE):
+            present = bloom_filter.gather(indices)
+        else:
+            present = np.frombuffer(bloom_filter, dtype=np.uint8)[indices]
+        return valid & (present != 0).all(axis=1)
+
+    def _check_compatible(self, other):
+        """
+        Ensures another filter was built with the same parameters so their bits can be combined.
+
+        Args:
+            other(BloomFilter): The filter to be combined with this one.
+        """
+        if type(other) != type(self):
+            raise TypeError("Cannot combine %s with %s" % (type(self).__name__, type(other).__name__))
+        if other.m != self.m or list(other.seed_list) != list(self.seed_list) or other.hash_mode != self.hash_mode \
+                or other.key_encoding != self.key_encoding:
+            raise ValueError("Filters must share m, seed_list, hash_mode and key_encoding to be combined")
+        if not isinstance(self.bit_array, BitArray) or not isinstance(other.bit_array, BitArray):
+            raise TypeError("Filters must use packed bit arrays to be combined")
+
+    def union(self, other):
+        """
+        Merges two filters, the result contains every item inserted into either filter.
+
+        Args:
+            other(BloomFilter): A filter sharing m, seed_list and hash_mode with this one.
+
+        Returns:
+            BloomFilter: A new filter holding the bitwise OR of both filters.
+        """
+        self._check_compatible(other)
+        return self._from_parameters(self.m, list(self.seed_list), self.hash_mode, self.key_encoding,
+                                     self.bit_array.bitwise_or(other.bit_array))
+
+    def intersection(self, other):
+        """
+        Intersects two filters, the result may contain any item inserted into both filters.
+        The false positive rate of the result is at least that of a filter built from the common items.
+
+        Args:
+            other(BloomFilter): A filter sharing m, seed_list and hash_mode with this one.
+
+        Returns:
+            BloomFilter: A new filter holding the bitwise AND of both filters.
+        """
+        self._check_compatible(other)
+        return self._from_parameters(self.m, list(self.seed_list), self.hash_mode, self.key_encoding,
+                                     self.bit_array.bitwise_and(other.bit_array))
+
+    def estimated_cardinality(self):
+        """
+        Estimates the number of distinct items inserted from the fraction of set bits, n = -(m / k) * ln(1 - X / m).
+
+        Returns:
+            float: The estimated quantity (n) of items in the filter, infinite if every bit is set.
+        """
+        bit_array = self.bit_array
+        if not isinstance(bit_array, self._STORAGE):
+            bit_array = BitArray.from_legacy(bit_array)
+        set_bits = bit_array.count()
+        if set_bits >= self.m:
+            return math.inf
+        return -(self.m / len(self.seed_list)) * math.log(1 - set_bits / self.m)
+
+    def to_bytes(self, bloom_filter=None):
+        """
+        Serializes a bloom filter with the parameters needed to read it back.
+
+        Args:
+            bloom_filter(BitArray, bytearray): (Optional) The filter to serialize, a bytearray is read as the
+                legacy layout of one byte per bit. Defaults to the filter owned by this object.
+
+        Returns:
+            bytes: The header followed by the packed bit array.
+        """
+        if bloom_filter is None:
+            bloom_filter = self.bit_array
+        if not isinstance(bloom_filter, self._STORAGE):
+            bloom_filter = self._STORAGE.from_legacy(bloom_filter)
+        if bloom_filter.size != self.m:
+            raise ValueError("Filter holds %s bits, expected %s" % (bloom_filter.size, self.m))
+        header = self._HEADER.pack(self.FILE_MAGIC, self.FILE_VERSION, self.FILTER_TYPE,
+                                   HASH_MODES.index(self.hash_mode), KEY_ENCODINGS.index(self.key_encoding),
+                                   self.m, len(self.seed_list))
+        header += struct.pack("<%sI" % len(self.seed_list), *self.seed_list)
+        header += bytes(-len(header) % 8)
+        return header + bytes(bloom_filter.data)
+
+    def save(self, path, bloom_filter=None):
+        """
+        Writes a serialized bloom filter to a file.
+
+        Args:
+            path(str): Path of the file to write.
+            bloom_filter(BitArray, bytearray): (Optional) The filter to save. Defaults to the filter owned by
+                this object.
+        """
+        with open(path, "wb") as filter_file:
+            filter_file.write(self.to_bytes(bloom_filter))
+
+    @classmethod
+    def _read_header(cls, data):
+        """
+        Parses the header of a serialized bloom filter.
+
+        Args:
+            data(bytes, mmap): The serialized filter.
+
+        Returns:
+            tuple[int, list[int], str, str, int]: The size m, the seed list, the hash mode, the key encoding and
+                the offset of the bit array.
+        """
+        if len(data) < cls._HEADER.size:
+            raise ValueError("Data is too short to hold a bloom filter header")
+        magic, version, filter_type, hash_mode, key_encoding, m, k = cls._HEADER.unpack_from(data, 0)
+        if magic != cls.FILE_MAGIC:
+            raise ValueError("Data is not a serialized bloom filter")
+        if version != cls.FILE_VERSION:
+            raise ValueError("Unsupported bloom filter format version %s" % version)
+        if filter_type != cls.FILTER_TYPE:
+            raise ValueError("Serialized filter type %s cannot be read by %s" % (filter_type, cls.__name__))
+        if hash_mode >= len(HASH_MODES):
+            raise ValueError("Unknown hash mode %s" % hash_mode)
+        if key_encoding >= len(KEY_ENCODINGS):
+            raise ValueError("Unknown key encoding %s" % key_encoding)
+        seeds = list(struct.unpack_from("<%sI" % k, data, cls._HEADER.size))
+        offset = cls._HEADER.size + 4 * k
+        offset += -offset % 8
+        if len(data) - offset != cls._STORAGE.byte_length(m):
+            raise ValueError("Expected %s bytes of filter data, got %s" % (cls._STORAGE.byte_length(m),
+                                                                           len(data) - offset))
+        return m, seeds, HASH_MODES[hash_mode], KEY_ENCODINGS[key_encoding], offset
+
+    @classmethod
+    def _from_parameters(cls, m, seeds, hash_mode, key_encoding, bit_array):
+        """
+        Builds a filter object around existing parameters and bits without allocating or seeding.
+
+        Args:
+            m(int): Size of bloom filter array.
+            seeds(list[int]): A list of k seeds for the hashing algorithm.
+            hash_mode(str): The hashing mode the filter was built with.
+            key_encoding(str): The key encoding the filter was built with.
+            bit_array(BitArray): The bits of the filter.
+
+        Returns:
+            BloomFilter: The filter object.
+        """
+        bloom = cls.__new__(cls)
+        bloom.seed_list = seeds
+        bloom.m = m
+        bloom.legacy_layout = False
+        bloom.hash_mode = hash_mode
+        bloom.key_encoding = key_encoding
+        bloom.bit_array = bit_array
+        return bloom
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Reads a serialized bloom filter into memory.
+
+        Args:
+            data(bytes): The serialized filter produced by to_bytes.
+
+        Returns:
+            BloomFilter: A filter object owning a copy of the bits.
+        """
+        m, seeds, hash_mode, key_encoding, offset = cls._read_header(data)
+        return cls._from_parameters(m, seeds, hash_mode, key_encoding, cls._STORAGE(m, bytearray(data[offset:])))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a serialized bloom filter file into memory.
+
+        Args:
+            path(str): Path of the file written by save.
+
+        Returns:
+            BloomFilter: A filter object owning a copy of the bits.
+        """
+        with open(path, "rb") as filter_file:
+            return cls.from_bytes(filter_file.read())
+
+    @classmethod
+    def open_mmap(cls, path):
+        """
+        Opens a serialized bloom filter file as a read only memory map, nothing is read into memory up front.
+        Processes opening the same file share its pages through the page cache. The filter cannot be added to.
+
+        Args:
+            path(str): Path of the file written by save.
+
+        Returns:
+            BloomFilter: A filter object whose bits are backed by the memory map.
+        """
+        with open(path, "rb") as filter_file:
+            mapped = mmap.mmap(filter_file.fileno(), 0, access=mmap.ACCESS_READ)
+        m, seeds, hash_mode, key_encoding, offset = cls._read_header(mapped)
+        return cls._from_parameters(m, seeds, hash_mode, key_encoding, cls._STORAGE(m, memoryview(mapped)[offset:]))
+
     @staticmethod
     def calculate_ideal_filter_size_m(expected_quantity_of_elements, desired_false_positive_rate):
         """
@@ -0,0 +1,76 @@
+from BasicBloomFilter.bit_array import CounterArray
+from BasicBloomFilter.bloom_filter import BloomFilter
+from hashing import encode_key, HASH_MODE_SEEDED, KEY_ENCODING_STR
+
+
+class CountingBloomFilter(BloomFilter):
+    """
+    Counting bloom filter, stores a 4 bit saturating counter in place of each bit so items can be removed.
+    Seeds and index derivation are shared with BloomFilter, an item is present while all k of its counters
+    are non zero.
+    """
+    FILTER_TYPE = 2
+    _STORAGE = CounterArray
+
+    def __init__(self, m=BloomFilter._M, k=BloomFilter._K, hash_mode=HASH_MODE_SEEDED, key_encoding=KEY_ENCODING_STR):
+        """
+        Constructor
+
+        Args:
+            m(int): Number of counters in the filter.
+            k(int): Number of unique hashing algorithms to use.
+            hash_mode(str): (Optional) HASH_MODE_SEEDED to hash once per seed, HASH_MODE_DOUBLE to derive
+                all k indices from a single hash.
+            key_encoding(str): (Optional) KEY_ENCODING_STR to hash the string of every item, KEY_ENCODING_TYPED
+                to hash integers and bytes directly.
+        """
+        super().__init__(m, k, hash_mode=hash_mode, key_encoding=key_encoding)
+
+    def _insert(self, bloom_filter, items, seeds, m):
+        """
+        Inserts items into an existing counter array.
+
+        Args:
+            bloom_filter(CounterArray): The counters representing the bloom filter.
+            items(iterable, dict): The items to be inserted, dictionaries are inserted as key:value pairs.
+            seeds(list): A list of k seeds for the hashing algorithm.
+            m(int): Number of counters in the filter.
+        """
+        if type(items) == dict:
+            items = [str(key) + ":" + str(value) for key, value in items.items()]
+        for item in items:
+            for index in self._indices(encode_key(item, self.key_encoding), seeds, m):
+                bloom_filter.increment(index)
+
+    def remove(self, item):
+        """
+        Removes a single item from the filter owned by this object.
+        Items which are not present are ignored, decrementing their counters would remove other items.
+
+        Args:
+            item: The item to be removed, a dictionary is removed as key:value pairs.
+
+        Returns:
+            bool: True if the item was present and has been removed.
+        """
+        if type(item) == dict:
+            removed = False
+            for key, value in item.items():
+                removed = self.remove(str(key) + ":" + str(value)) or removed
+            return removed
+        indices = self._indices(encode_key(item, self.key_encoding), self.seed_list, self.m)
+        if not self.bit_array.test_bits(indices):
+            return False
+        for index in indices:
+            self.bit_array.decrement(index)
+        return True
+
+    def remove_many(self, items):
+        """
+        Removes a number of items from the filter owned by this object.
+
+        Args:
+            items(iterable): The items to be removed.
+        """
+        for item in items:
+            self.remove(item)
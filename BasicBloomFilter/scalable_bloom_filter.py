@@ -0,0 +1,122 @@
+from BasicBloomFilter.bloom_filter import BloomFilter
+from hashing import HASH_MODE_SEEDED, KEY_ENCODING_STR
+
+
+class ScalableBloomFilter:
+    """
+    Scalable bloom filter, grows by stacking progressively larger bloom filters as items are added.
+    Each new layer holds growth_factor times the items of the previous one with a false positive rate
+    tightened by tightening_ratio, so the compound false positive rate stays below the requested rate
+    however many items are inserted.
+    """
+    _CAPACITY = 1000
+    _FALSE_POSITIVE_RATE = 0.01
+    GROWTH_FACTOR = 2
+    TIGHTENING_RATIO = 0.9
+
+    def __init__(self, initial_capacity=_CAPACITY, false_positive_rate=_FALSE_POSITIVE_RATE,
+                 growth_factor=GROWTH_FACTOR, tightening_ratio=TIGHTENING_RATIO, hash_mode=HASH_MODE_SEEDED,
+                 key_encoding=KEY_ENCODING_STR):
+        """
+        Constructor
+
+        Args:
+            initial_capacity(int): The number of elements the first layer is sized for.
+            false_positive_rate(float): The upper bound on the false positive rate (f) of the whole filter. 1 > f > 0.
+            growth_factor(int): How many times larger the capacity of each new layer is.
+            tightening_ratio(float): How much the false positive rate shrinks with each new layer. 1 > r > 0.
+            hash_mode(str): (Optional) Hashing mode used by every layer.
+            key_encoding(str): (Optional) Key encoding used by every layer.
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("False positive rate must be between 0 and 1")
+        if not 0 < tightening_ratio < 1:
+            raise ValueError("Tightening ratio must be between 0 and 1")
+        self.initial_capacity = initial_capacity
+        self.false_positive_rate = false_positive_rate
+        self.growth_factor = growth_factor
+        self.tightening_ratio = tightening_ratio
+        self.hash_mode = hash_mode
+        self.key_encoding = key_encoding
+        self.filters = []
+        self.capacities = []
+        self.counts = []
+        self._add_layer()
+
+    def _add_layer(self):
+        """
+        Appends a new, larger and tighter bloom filter layer.
+        Layer i is sized for initial_capacity * growth_factor^i elements at a false positive rate of
+        false_positive_rate * (1 - r) * r^i, the rates form a geometric series summing to false_positive_rate.
+        """
+        layer = len(self.filters)
+        capacity = int(self.initial_capacity * self.growth_factor ** layer)
+        rate = self.false_positive_rate * (1 - self.tightening_ratio) * self.tightening_ratio ** layer
+        values = BloomFilter.calculate_desired_filter_values(capacity, rate)
+        self.filters.append(BloomFilter(m=values["m"], k=max(1, values["k"]), hash_mode=self.hash_mode,
+                                        key_encoding=self.key_encoding))
+        self.capacities.append(capacity)
+        self.counts.append(0)
+
+    def add(self, item):
+        """
+        Inserts an item into the newest layer, adding a layer first if the newest one is full.
+        Items which may already be present are not inserted again so they do not use up capacity.
+
+        Args:
+            item: The item to be inserted.
+
+        Returns:
+            bool: True if the item was inserted, False if it may already be present.
+        """
+        if item in self:
+            return False
+        if self.counts[-1] >= self.capacities[-1]:
+            self._add_layer()
+        self.filters[-1].add(item)
+        self.counts[-1] += 1
+        return True
+
+    def add_many(self, items):
+        """
+        Inserts a number of items.
+
+        Args:
+            items(iterable): The items to be inserted.
+        """
+        for item in items:
+            self.add(item)
+
+    def verify_item(self, item):
+        """
+        Verifies if an item is present in any layer of the filter.
+
+        Args:
+            item: The item to be checked.
+
+        Returns:
+            bool: If the item may be in the bloom filter or not.
+        """
+        for bloom in reversed(self.filters):
+            if bloom.verify_item(item):
+                return True
+        return False
+
+    def __contains__(self, item):
+        return self.verify_item(item)
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def calculate_approximate_false_positive_rate(self):
+        """
+        Calculates the approximate false positive rate of the filter from the current fill of every layer.
+
+        Returns:
+            float: The probability of false positives (f) across all layers. 1 >= f >= 0.
+        """
+        true_negative_rate = 1
+        for bloom, count in zip(self.filters, self.counts):
+            true_negative_rate *= 1 - BloomFilter.calculate_approximate_false_positive_rate(
+                bloom.m, count, len(bloom.seed_list))
+        return 1 - true_negative_rate
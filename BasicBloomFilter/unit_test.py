@@ -1,5 +1,12 @@
+import os
+import tempfile
 import unittest
 from BasicBloomFilter.bloom_filter import BloomFilter
+from BasicBloomFilter.bit_array import BitArray
+from BasicBloomFilter.blocked_bloom_filter import BlockedBloomFilter
+from BasicBloomFilter.scalable_bloom_filter import ScalableBloomFilter
+from BasicBloomFilter.counting_bloom_filter import CountingBloomFilter
+from hashing import encode_key, HASH_MODE_DOUBLE, KEY_ENCODING_TYPED
 
 
 class TestBloom(unittest.TestCase):
@@ -26,3 +33,146 @@ class TestBloom(unittest.TestCase):
         assert self.bf.verify_item({"dog": "dog"}, dict_bloom) is True
         assert self.bf.verify_item({"fly": "cat"}, dict_bloom) is True
         assert self.bf.verify_item({"cat": "fly"}, dict_bloom) is False
+
+    def test_filter_bit_packed(self):
+        test_list = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+        packed_bloom = self.bf.generate_filter(test_list)
+        assert isinstance(packed_bloom, BitArray)
+        assert len(packed_bloom.data) == (self.bf.m + 7) // 8
+        assert self.bf.verify_item(3, packed_bloom) is True
+
+    def test_filter_legacy_layout(self):
+        legacy_bf = BloomFilter(legacy_layout=True)
+        legacy_bf.seed_list = self.bf.seed_list
+        legacy_bloom = legacy_bf.generate_filter(["dog", "cat"])
+        assert type(legacy_bloom) == bytearray
+        assert len(legacy_bloom) == legacy_bf.m
+        assert self.bf.verify_item("dog", legacy_bloom) is True
+        assert BitArray.from_legacy(legacy_bloom) == self.bf.generate_filter(["dog", "cat"])
+
+    def test_verify_many(self):
+        test_list = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+        list_bloom = self.bf.generate_filter(test_list)
+        results = self.bf.verify_many([7, 11, 2, {"dog": "dog"}], list_bloom)
+        expected = [self.bf.verify_item(item, list_bloom) for item in [7, 11, 2, {"dog": "dog"}]]
+        assert results.tolist() == expected
+        assert results.tolist()[:3] == [True, False, True]
+
+    def test_filter_double_hashing(self):
+        double_bf = BloomFilter(hash_mode=HASH_MODE_DOUBLE)
+        test_list = ["dog", "cat", "elephant"]
+        double_bloom = double_bf.generate_filter(test_list)
+        for item in test_list:
+            assert double_bf.verify_item(item, double_bloom) is True
+        assert double_bf.verify_many(test_list, double_bloom).all()
+
+    def test_blocked_filter(self):
+        blocked_bf = BlockedBloomFilter(m=2000, k=7)
+        assert blocked_bf.m % BlockedBloomFilter.BLOCK_SIZE == 0
+        test_list = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+        blocked_bloom = blocked_bf.generate_filter(test_list)
+        for item in test_list:
+            assert blocked_bf.verify_item(item, blocked_bloom) is True
+            indices = blocked_bf._indices(str(item).encode(), blocked_bf.seed_list, blocked_bf.m)
+            assert len({index // BlockedBloomFilter.BLOCK_SIZE for index in indices}) == 1
+        assert blocked_bf.verify_item(11, blocked_bloom) is False
+
+    def test_blocked_false_positive_rate(self):
+        standard = BloomFilter.calculate_approximate_false_positive_rate(1 << 20, 100000, 7)
+        blocked = BlockedBloomFilter.calculate_approximate_blocked_false_positive_rate(1 << 20, 100000, 7)
+        assert standard < blocked < 2 * standard
+
+    def test_incremental_add(self):
+        incremental_bf = BloomFilter()
+        incremental_bf.add("dog")
+        incremental_bf.add_many(["cat", "elephant"])
+        incremental_bf.add({"fly": "cat"})
+        assert "dog" in incremental_bf
+        assert "elephant" in incremental_bf
+        assert {"fly": "cat"} in incremental_bf
+        assert "fly" not in incremental_bf
+        assert incremental_bf.bit_array == incremental_bf.generate_filter(["dog", "cat", "elephant", "fly:cat"])
+
+    def test_serialization_round_trip(self):
+        double_bf = BlockedBloomFilter(m=1000, hash_mode=HASH_MODE_DOUBLE)
+        double_bf.add_many(["dog", "cat", "elephant"])
+        loaded = BlockedBloomFilter.from_bytes(double_bf.to_bytes())
+        assert loaded.seed_list == double_bf.seed_list
+        assert loaded.hash_mode == HASH_MODE_DOUBLE
+        assert loaded.bit_array == double_bf.bit_array
+        assert "cat" in loaded
+        with self.assertRaises(ValueError):
+            BloomFilter.from_bytes(double_bf.to_bytes())
+
+    def test_open_mmap(self):
+        test_list = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+        list_bloom = self.bf.generate_filter(test_list)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "filter.bloom")
+            self.bf.save(path, list_bloom)
+            mapped = BloomFilter.open_mmap(path)
+            assert mapped.verify_item(7) is True
+            assert mapped.verify_item(11) is False
+            assert mapped.verify_many(test_list).all()
+
+    def test_scalable_filter(self):
+        scalable_bf = ScalableBloomFilter(initial_capacity=100, false_positive_rate=0.01)
+        scalable_bf.add_many(range(1000))
+        assert len(scalable_bf.filters) > 1
+        assert scalable_bf.filters[1].m > scalable_bf.filters[0].m
+        assert all(item in scalable_bf for item in range(1000))
+        assert scalable_bf.calculate_approximate_false_positive_rate() < 0.01
+        false_positives = sum(item in scalable_bf for item in range(1000, 6000))
+        assert false_positives < 0.02 * 5000
+
+    def test_counting_filter(self):
+        counting_bf = CountingBloomFilter()
+        assert len(counting_bf.bit_array.data) == (counting_bf.m + 1) // 2
+        counting_bf.add_many(["dog", "cat", "elephant"])
+        counting_bf.add("dog")
+        assert counting_bf.remove("dog") is True
+        assert "dog" in counting_bf
+        assert counting_bf.remove("dog") is True
+        assert "dog" not in counting_bf
+        assert counting_bf.remove("fly") is False
+        assert counting_bf.verify_many(["cat", "elephant", "dog"]).tolist() == [True, True, False]
+        loaded = CountingBloomFilter.from_bytes(counting_bf.to_bytes())
+        assert loaded.bit_array == counting_bf.bit_array
+
+    def test_counting_filter_saturates(self):
+        counting_bf = CountingBloomFilter(m=50, k=1)
+        for i in range(20):
+            counting_bf.add("dog")
+        for i in range(20):
+            counting_bf.remove("dog")
+        assert "dog" in counting_bf
+
+    def test_union_and_intersection(self):
+        shard_a = BloomFilter(m=4096, k=5)
+        shard_b = BloomFilter(m=4096, k=5)
+        shard_b.seed_list = shard_a.seed_list
+        shard_a.add_many(range(0, 300))
+        shard_b.add_many(range(200, 500))
+        merged = shard_a.union(shard_b)
+        assert merged.bit_array == shard_a.generate_filter(range(0, 500))
+        common = shard_a.intersection(shard_b)
+        assert all(item in common for item in range(200, 300))
+        with self.assertRaises(ValueError):
+            shard_a.union(BloomFilter(m=4096, k=5))
+
+    def test_estimated_cardinality(self):
+        estimate_bf = BloomFilter(m=20000, k=5)
+        estimate_bf.add_many(range(1000))
+        assert 950 < estimate_bf.estimated_cardinality() < 1050
+
+    def test_typed_key_encoding(self):
+        assert encode_key(7, KEY_ENCODING_TYPED) == (7).to_bytes(8, "little")
+        assert encode_key(b"dog", KEY_ENCODING_TYPED) == b"dog"
+        assert encode_key(7) == b"7"
+        typed_bf = BloomFilter(key_encoding=KEY_ENCODING_TYPED)
+        typed_bf.add_many([1, 2, 3, b"dog", "cat"])
+        assert all(item in typed_bf for item in [1, 2, 3, b"dog", "cat"])
+        assert typed_bf.verify_many([1, 2, 3, b"dog", "cat"]).all()
+        loaded = BloomFilter.from_bytes(typed_bf.to_bytes())
+        assert loaded.key_encoding == KEY_ENCODING_TYPED
+        assert 2 in loaded
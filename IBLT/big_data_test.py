@@ -1,5 +1,5 @@
 # Created By Nick Huppert on 13/5/20.
-from iblt import IBloomLT
+from IBLT.iblt import IBloomLT
 from random import randint
 import os
 
@@ -0,0 +1,202 @@
+import numpy as np
+
+_WORD_BITS = 64
+_WORD_MASK = (1 << _WORD_BITS) - 1
+
+
+class ColumnarTable:
+    """
+    Invertible bloom lookup table stored as parallel NumPy arrays instead of a list of (idSum, hashSum, count) tuples.
+    idSum is held as id_words uint64 words per cell, hashSum as 2 uint64 words (128 bits) and count as int32.
+    Words are stored least significant first. Indexing a cell returns and accepts (idSum, hashSum, count) tuples
+    so code written against list tables keeps working.
+    """
+    DEFAULT_ID_WORDS = 2
+    HASH_WORDS = 2
+
+    def __init__(self, m, id_words=DEFAULT_ID_WORDS):
+        """
+        Constructor
+
+        Args:
+            m(int): Number of cells in the table.
+            id_words(int): Number of 64 bit words per idSum, 1 for IDs below 2^64 or 2 for IDs below 2^128.
+        """
+        self.m = int(m)
+        self.id_words = id_words
+        self.id_sum = np.zeros((self.m, id_words), dtype=np.uint64)
+        self.hash_sum = np.zeros((self.m, self.HASH_WORDS), dtype=np.uint64)
+        self.count = np.zeros(self.m, dtype=np.int32)
+
+    @staticmethod
+    def split(value, words):
+        """
+        Splits a non negative integer into 64 bit words, least significant first.
+
+        Args:
+            value(int): The integer to split.
+            words(int): Number of words to split into.
+
+        Returns:
+            numpy.ndarray: The words as a uint64 array.
+        """
+        if value < 0 or value >> (_WORD_BITS * words):
+            raise ValueError("%s does not fit in %s unsigned 64 bit words" % (value, words))
+        return np.array([(value >> (_WORD_BITS * position)) & _WORD_MASK for position in range(words)],
+                        dtype=np.uint64)
+
+    @staticmethod
+    def join(words):
+        """
+        Joins 64 bit words, least significant first, back into an integer.
+
+        Args:
+            words(numpy.ndarray): The uint64 words.
+
+        Returns:
+            int: The joined integer.
+        """
+        value = 0
+        for position, word in enumerate(words.tolist()):
+            value |= word << (_WORD_BITS * position)
+        return value
+
+    def add_element(self, element_id, element_hash, indices, alteration):
+        """
+        XORs an element into the given cells and adjusts their counts.
+        Inserting uses an alteration of 1, peeling an element out uses -1 for table 1 elements and 1 for table 2.
+
+        Args:
+            element_id(int): The ID of the element.
+            element_hash(int): The hash of the element stored in the hashSum field.
+            indices(list[int]): The cells of the element, repeated cells are applied repeatedly unless the policy
+                was built with distinct_cells.
+            alteration(int): Amount added to the count of each cell.
+        """
+        np.bitwise_xor.at(self.id_sum, indices, self.split(element_id, self.id_words))
+        np.bitwise_xor.at(self.hash_sum, indices, self.split(element_hash, self.HASH_WORDS))
+        np.add.at(self.count, indices, alteration)
+
+    def merge(self, other):
+        """
+        Adds the contents of another table into this one in place. Tables built from disjoint sets of items
+        with the same parameters merge into exactly the table of the combined set.
+
+        Args:
+            other(ColumnarTable): A table of the same size and id width.
+
+        Returns:
+            ColumnarTable: This table.
+        """
+        if self.m != other.m or self.id_words != other.id_words:
+            raise ValueError("Tables must share size and id width to be merged")
+        np.bitwise_xor(self.id_sum, other.id_sum, out=self.id_sum)
+        np.bitwise_xor(self.hash_sum, other.hash_sum, out=self.hash_sum)
+        np.add(self.count, other.count, out=self.count)
+        return self
+
+    def subtract(self, other):
+        """
+        Builds the symmetric difference table of two tables with vectorized XOR and subtraction.
+
+        Args:
+            other(ColumnarTable): A table of the same size and id width.
+
+        Returns:
+            ColumnarTable: A new table, counts are positive for elements only in this table.
+        """
+        if self.m != other.m or self.id_words != other.id_words:
+            raise ValueError("Tables must share size and id width to be subtracted")
+        difference = ColumnarTable(self.m, self.id_words)
+        np.bitwise_xor(self.id_sum, other.id_sum, out=difference.id_sum)
+        np.bitwise_xor(self.hash_sum, other.hash_sum, out=difference.hash_sum)
+        np.subtract(self.count, other.count, out=difference.count)
+        return difference
+
+    def truncate_hash_sums(self, checksum_bytes):
+        """
+        Keeps only the low checksum_bytes bytes of every hashSum, in place.
+
+        Args:
+            checksum_bytes(int): Width of the checksum in bytes.
+        """
+        bits = 8 * checksum_bytes
+        for word in range(self.HASH_WORDS):
+            word_bits = min(max(bits - _WORD_BITS * word, 0), _WORD_BITS)
+            if word_bits < _WORD_BITS:
+                self.hash_sum[:, word] &= np.uint64((1 << word_bits) - 1)
+
+    def pure_candidates(self):
+        """
+        Finds the cells which could hold a single element, those with a count of 1 or -1.
+
+        Returns:
+            numpy.ndarray: The indices of the candidate cells.
+        """
+        return np.flatnonzero(np.abs(self.count) == 1)
+
+    def nonempty_cells(self):
+        """
+        Finds the cells where any of idSum, hashSum or count is not zero.
+
+        Returns:
+            numpy.ndarray: The indices of the non empty cells.
+        """
+        return np.flatnonzero(self.id_sum.any(axis=1) | self.hash_sum.any(axis=1) | (self.count != 0))
+
+    def copy(self):
+        """
+        Copies the table.
+
+        Returns:
+            ColumnarTable: An independent copy of the table.
+        """
+        duplicate = ColumnarTable(self.m, self.id_words)
+        duplicate.id_sum[:] = self.id_sum
+        duplicate.hash_sum[:] = self.hash_sum
+        duplicate.count[:] = self.count
+        return duplicate
+
+    @classmethod
+    def from_list(cls, table, id_words=DEFAULT_ID_WORDS):
+        """
+        Converts a table in list format into columnar format.
+
+        Args:
+            table(list): An IBLT as a list of (idSum, hashSum, count) cells.
+            id_words(int): Number of 64 bit words per idSum.
+
+        Returns:
+            ColumnarTable: The columnar table.
+        """
+        columnar = cls(len(table), id_words)
+        for index, cell in enumerate(table):
+            columnar[index] = cell
+        return columnar
+
+    def to_list(self):
+        """
+        Converts the table into list format.
+
+        Returns:
+            list[tuple]: An IBLT as a list of tuples, each element is of the form (idSum, hashSum, count).
+        """
+        return [self[index] for index in range(self.m)]
+
+    def __len__(self):
+        return self.m
+
+    def __getitem__(self, index):
+        return self.join(self.id_sum[index]), self.join(self.hash_sum[index]), int(self.count[index])
+
+    def __setitem__(self, index, cell):
+        self.id_sum[index] = self.split(cell[0], self.id_words)
+        self.hash_sum[index] = self.split(cell[1], self.HASH_WORDS)
+        self.count[index] = cell[2]
+
+    def __eq__(self, other):
+        if not isinstance(other, ColumnarTable):
+            return NotImplemented
+        return self.m == other.m and self.id_words == other.id_words and \
+            np.array_equal(self.id_sum, other.id_sum) and np.array_equal(self.hash_sum, other.hash_sum) and \
+            np.array_equal(self.count, other.count)
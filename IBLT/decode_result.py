@@ -0,0 +1,75 @@
+import math
+from IBLT.columnar_table import ColumnarTable
+
+
+class DecodeResult(tuple):
+    """
+    Result of decoding the difference of two IBLTs.
+    Behaves as the (table1 differences, table2 differences, "Success" or "Failed") tuple returned by compare_tables
+    and additionally carries what was left when peeling stopped: the residual non empty cells and an estimate of
+    the number of elements still hidden in them.
+    """
+
+    def __new__(cls, table1_differences, table2_differences, residual_cells=(), remaining_estimate=0, rounds=1):
+        """
+        Constructor
+
+        Args:
+            table1_differences(list[tuple]): The recovered elements only in table 1.
+            table2_differences(list[tuple]): The recovered elements only in table 2.
+            residual_cells(list[tuple]): (Optional) (index, (idSum, hashSum, count)) of the cells which could not
+                be emptied.
+            remaining_estimate(int): (Optional) Estimated number of elements still in the residual cells.
+            rounds(int): (Optional) Number of decoding rounds the result took.
+        """
+        success = "Failed" if residual_cells else "Success"
+        result = super().__new__(cls, (table1_differences, table2_differences, success))
+        result.residual_cells = list(residual_cells)
+        result.remaining_estimate = remaining_estimate
+        result.rounds = rounds
+        return result
+
+    def __getnewargs__(self):
+        return self[0], self[1], self.residual_cells, self.remaining_estimate, self.rounds
+
+    @classmethod
+    def from_table(cls, table1_differences, table2_differences, table, mean_hashes):
+        """
+        Builds the result from a difference table after peeling has stopped.
+        A cell only counts as empty when its idSum, hashSum and count are all zero, since a short checksum can
+        cancel out while elements are left in the cell.
+        The remaining elements are estimated from the share of cells left occupied, as in linear counting, since
+        counts of elements from both tables cancel within a cell. The total absolute count over the mean number of
+        cells an element occupies is used as a lower bound.
+
+        Args:
+            table1_differences(list[tuple]): The recovered elements only in table 1.
+            table2_differences(list[tuple]): The recovered elements only in table 2.
+            table(list, ColumnarTable): The difference table left after peeling.
+            mean_hashes(float): Mean number of cells each element was inserted into.
+
+        Returns:
+            DecodeResult: The decoding result.
+        """
+        if isinstance(table, ColumnarTable):
+            indices = table.nonempty_cells().tolist()
+        else:
+            indices = [index for index in range(len(table)) if table[index] != (0, 0, 0)]
+        residual_cells = [(index, tuple(table[index])) for index in indices]
+        remaining_estimate = 0
+        if residual_cells:
+            mean_hashes = max(mean_hashes, 1)
+            total_count = sum(abs(cell[2]) for index, cell in residual_cells)
+            remaining_estimate = total_count / mean_hashes
+            if len(residual_cells) < len(table):
+                remaining_estimate = max(remaining_estimate,
+                                         -len(table) / mean_hashes * math.log(1 - len(residual_cells) / len(table)))
+            remaining_estimate = max(1, int(math.ceil(remaining_estimate)))
+        return cls(table1_differences, table2_differences, residual_cells, remaining_estimate)
+
+    @property
+    def success(self):
+        """
+        bool: True if every cell was emptied and both difference lists are complete.
+        """
+        return self[2] == "Success"
@@ -0,0 +1,252 @@
+import numpy as np
+from collections import deque
+from IBLT.columnar_table import ColumnarTable
+from IBLT.decode_result import DecodeResult
+from IBLT.parallel_encoding import encode_parallel
+from hashing import encode_key, truncate_checksum, CHECKSUM_BYTES, KEY_ENCODING_STR, KEY_ENCODINGS
+
+_WORD_MASK = (1 << 64) - 1
+
+
+class IBLTEngine:
+    """
+    Encoding, peeling and decoding shared by every IBLT variant.
+    How many cells an element occupies and which ones is left to a hash count policy, FixedHashPolicy for IBloomLT
+    and DeciderHashPolicy for RIBLT and the ALOHA IBLT, so the variants only differ in the policy they build.
+    Tables are lists of (idSum, hashSum, count) tuples or ColumnarTables.
+    """
+    BULK_BATCH_SIZE = 65536
+
+    def __init__(self, policy, key_encoding=KEY_ENCODING_STR, checksum_bytes=CHECKSUM_BYTES):
+        """
+        Constructor
+
+        Args:
+            policy(FixedHashPolicy, DeciderHashPolicy): Decides the checksum hash and cells of every element.
+            key_encoding(str): (Optional) KEY_ENCODING_STR to hash the string of every ID, KEY_ENCODING_TYPED
+                to hash integer IDs as fixed width bytes.
+            checksum_bytes(int): (Optional) Width in bytes of the hashSum checksum.
+        """
+        if key_encoding not in KEY_ENCODINGS:
+            raise ValueError("Unknown key encoding %s, expected one of %s" % (key_encoding, KEY_ENCODINGS))
+        self.policy = policy
+        self.key_encoding = key_encoding
+        self.checksum_bytes = checksum_bytes
+
+    def derive(self, element_id, m):
+        """
+        Derives the checksum and cells of an element.
+
+        Args:
+            element_id(int): The ID of the element.
+            m(int): Size of the IBLT.
+
+        Returns:
+            tuple[int, list[int]]: The checksum stored in the hashSum field and the cells of the element.
+        """
+        key = encode_key(element_id, self.key_encoding)
+        item_hash = self.policy.element_hash(key)
+        return truncate_checksum(item_hash, self.checksum_bytes), self.policy.indices(key, item_hash, m)
+
+    def encode(self, item_ids, m, columnar=False, id_words=ColumnarTable.DEFAULT_ID_WORDS):
+        """
+        Given a list of item IDs, generate a corresponding IBLT.
+
+        Args:
+            item_ids(iterable): The IDs of the items to be inserted.
+            m(int): Size of the IBLT.
+            columnar(bool): (Optional) Build a ColumnarTable backed by NumPy arrays instead of a list.
+            id_words(int): (Optional) Number of 64 bit words per idSum of a ColumnarTable.
+
+        Returns:
+            list[tuple], ColumnarTable: The IBLT.
+        """
+        table = ColumnarTable(m, id_words) if columnar else [(0, 0, 0)] * m
+        for item in item_ids:
+            checksum, indices = self.derive(item, m)
+            self.update_cells(item, checksum, indices, table, -1)
+        return table
+
+    def encode_bulk(self, item_ids, m, batch_size=BULK_BATCH_SIZE, id_words=ColumnarTable.DEFAULT_ID_WORDS):
+        """
+        Given a list of integer item IDs, generate a columnar IBLT in batches.
+        The cells and checksums of a whole batch are computed into arrays first, then folded into the table with
+        scatter XOR and add operations. The result is identical to encode(item_ids, m, columnar=True, id_words).
+
+        Args:
+            item_ids(list[int]): Non negative integer IDs below 2^(64 * id_words).
+            m(int): Size of the IBLT.
+            batch_size(int): (Optional) Number of items hashed and scattered together.
+            id_words(int): (Optional) Number of 64 bit words per idSum, 1 for IDs below 2^64.
+
+        Returns:
+            ColumnarTable: The IBLT.
+        """
+        table = ColumnarTable(m, id_words)
+        item_ids = list(item_ids)
+        for start in range(0, len(item_ids), batch_size):
+            batch = item_ids[start:start + batch_size]
+            if min(batch) < 0 or max(batch) >> (64 * table.id_words):
+                raise ValueError("Item IDs must be non negative and fit in %s bits" % (64 * table.id_words))
+            keys = [encode_key(item, self.key_encoding) for item in batch]
+            item_hashes = [self.policy.element_hash(key) for key in keys]
+            indices, quantities = self.policy.index_array(keys, item_hashes, m)
+            checksums = [truncate_checksum(item_hash, self.checksum_bytes) for item_hash in item_hashes]
+            id_words = np.zeros((len(batch), table.id_words), dtype=np.uint64)
+            if max(batch) >> 64:
+                for word in range(table.id_words):
+                    id_words[:, word] = [(item >> (64 * word)) & _WORD_MASK for item in batch]
+            else:
+                id_words[:, 0] = batch
+            hash_words = np.empty((len(batch), table.HASH_WORDS), dtype=np.uint64)
+            hash_words[:, 0] = [checksum & _WORD_MASK for checksum in checksums]
+            hash_words[:, 1] = [checksum >> 64 for checksum in checksums]
+            np.bitwise_xor.at(table.id_sum, indices, np.repeat(id_words, quantities, axis=0))
+            np.bitwise_xor.at(table.hash_sum, indices, np.repeat(hash_words, quantities, axis=0))
+            np.add.at(table.count, indices, 1)
+        return table
+
+    def encode_parallel(self, item_ids, m, workers=None, id_words=ColumnarTable.DEFAULT_ID_WORDS):
+        """
+        Given a list of integer item IDs, generate a columnar IBLT over a pool of worker processes.
+        Each worker bulk encodes one shard of the IDs from shared memory and the partial tables are merged.
+
+        Args:
+            item_ids(list[int]): Non negative integer IDs below 2^64.
+            m(int): Size of the IBLT.
+            workers(int): (Optional) Number of worker processes, defaults to the number of CPUs.
+            id_words(int): (Optional) Number of 64 bit words per idSum.
+
+        Returns:
+            ColumnarTable: The IBLT.
+        """
+        return encode_parallel(item_ids, self.encode_bulk, (m, self.BULK_BATCH_SIZE, id_words), workers)
+
+    @staticmethod
+    def subtract(table1, table2):
+        """
+        Builds the symmetric difference table of two tables, vectorized when both are ColumnarTables.
+
+        Args:
+            table1(list, ColumnarTable): Invertible bloom filter 1.
+            table2(list, ColumnarTable): Invertible bloom filter 2 of the same size.
+
+        Returns:
+            list[tuple], ColumnarTable: The difference table, counts are positive for elements only in table 1.
+        """
+        if isinstance(table1, ColumnarTable) and isinstance(table2, ColumnarTable):
+            return table1.subtract(table2)
+        return [(cell1[0] ^ cell2[0], cell1[1] ^ cell2[1], cell1[2] - cell2[2])
+                for cell1, cell2 in zip(table1, table2)]
+
+    def decode(self, table1, table2):
+        """
+        Compares 2 IBLTs and attempts to return the symmetric difference.
+        Only cells with a count of 1 or -1 can be pure and afterwards only the cells touched by a peel can change,
+        so decoding works from a queue of candidate cells and a rejected cell is not checked again until a peel
+        alters it. The checksum hash of a candidate is computed once and reused to derive its cells for the peel.
+        A candidate is only peeled when its checksum matches and its cells include the cell it was found in.
+        Every element of the difference adds one to the absolute count of each of its cells, so the number of
+        peels is capped at the total absolute count of the difference table. Tables decoded with a policy which
+        does not match the one they were built with stop there and fail instead of peeling forever.
+        The hashSums of the difference are cut down to checksum_bytes, so a table received with truncated
+        checksums decodes against one built at full width. Truncation keeps the low bytes, so the truncated
+        XOR equals the XOR of the truncated checksums.
+
+        Args:
+            table1(list, ColumnarTable): Invertible bloom filter 1.
+            table2(list, ColumnarTable): Invertible bloom filter 2.
+
+        Returns:
+            DecodeResult:
+                The extra elements from filter 1, the extra elements from filter 2 and a string to confirm if the
+                    decoding was successful, along with the residual cells left when decoding fails.
+        """
+        if len(table1) != len(table2):
+            return False
+        m = len(table1)
+        table1_differences = []
+        table2_differences = []
+        table3 = self.subtract(table1, table2)
+        if self.checksum_bytes < CHECKSUM_BYTES:
+            if isinstance(table3, ColumnarTable):
+                table3.truncate_hash_sums(self.checksum_bytes)
+            else:
+                table3 = [(cell[0], truncate_checksum(cell[1], self.checksum_bytes), cell[2]) for cell in table3]
+        if isinstance(table3, ColumnarTable):
+            queue = deque(table3.pure_candidates().tolist())
+            peels_left = int(np.abs(table3.count.astype(np.int64)).sum())
+        else:
+            queue = deque(index for index in range(m) if table3[index][2] == 1 or table3[index][2] == -1)
+            peels_left = sum(abs(cell[2]) for cell in table3)
+        queued = [False] * m
+        for index in queue:
+            queued[index] = True
+        policy = self.policy
+        while queue and peels_left > 0:
+            index = queue.popleft()
+            queued[index] = False
+            element = table3[index]
+            if element[2] == 1 or element[2] == -1:
+                key = encode_key(element[0], self.key_encoding)
+                item_hash = policy.element_hash(key)
+                checksum = truncate_checksum(item_hash, self.checksum_bytes)
+                if checksum != element[1]:
+                    continue
+                indices = policy.indices(key, item_hash, m)
+                # A mixed cell can match a short checksum by chance, but the element it poses as rarely maps back
+                # to the cell, so such cells are left alone.
+                if index not in indices:
+                    continue
+                table3 = self.update_cells(element[0], checksum, indices, table3, element[2])
+                peels_left -= 1
+                if element[2] == 1:
+                    table1_differences.append(element)
+                else:
+                    table2_differences.append(element)
+                for touched_index in indices:
+                    if not queued[touched_index]:
+                        queued[touched_index] = True
+                        queue.append(touched_index)
+        # Whatever could not be peeled is kept on the result with an estimate of how many elements it hides.
+        return DecodeResult.from_table(table1_differences, table2_differences, table3, policy.mean_hashes())
+
+    def peel(self, element_id, table, alteration):
+        """
+        Peels a single element from a given IBLT, an alteration of -1 inserts it instead.
+
+        Args:
+            element_id(int): The element to be peeled.
+            table(list, ColumnarTable): The invertible bloom lookup table.
+            alteration(int): The indicator as to which list this element was stored in (1 OR -1)
+
+        Returns:
+            list[tuple], ColumnarTable: The updated table.
+        """
+        checksum, indices = self.derive(element_id, len(table))
+        return self.update_cells(element_id, checksum, indices, table, alteration)
+
+    @staticmethod
+    def update_cells(element_id, checksum, indices, table, alteration):
+        """
+        XORs an element out of the given cells and subtracts the alteration from their counts.
+        Lists are updated in place.
+
+        Args:
+            element_id(int): The ID of the element.
+            checksum(int): The checksum of the element stored in the hashSum field.
+            indices(list[int]): The cells of the element, repeated cells are applied repeatedly unless the policy
+                was built with distinct_cells.
+            table(list, ColumnarTable): The invertible bloom lookup table.
+            alteration(int): 1 or -1 to peel an element of table 1 or table 2, -1 also inserts an element.
+
+        Returns:
+            list[tuple], ColumnarTable: The updated table.
+        """
+        if isinstance(table, ColumnarTable):
+            table.add_element(element_id, checksum, indices, -alteration)
+            return table
+        for index in indices:
+            cell = table[index]
+            table[index] = (cell[0] ^ element_id, cell[1] ^ checksum, cell[2] - alteration)
+        return table
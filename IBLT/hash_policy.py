@@ -0,0 +1,391 @@
+import mmh3
+import random
+import numpy as np
+from bisect import bisect_right
+from functools import lru_cache
+from IBLT.engine import IBLTEngine
+from hashing import derive_indices, derive_index_array, CHECKSUM_BYTES, HASH_MODE_SEEDED, KEY_ENCODING_STR
+
+SEED_RANGE = 1000000
+MAX_HASHES = 15
+PARAMETER_CACHE_SIZE = 128
+DECIDER_TABLE = "table"
+DECIDER_THRESHOLD = "threshold"
+DECIDER_MODES = (DECIDER_TABLE, DECIDER_THRESHOLD)
+
+
+def distinct_indices(indices):
+    """
+    Drops repeated cells from the cells of an element, keeping the first occurrence of each.
+    An element inserted twice into a cell cancels out of its idSum and hashSum but not its count, so another
+    element in that cell could later look pure with the wrong sign. Policies built with distinct_cells use this so
+    every element touches a cell once, which changes the tables of elements with repeated cells.
+
+    Args:
+        indices(list[int]): The cells of an element.
+
+    Returns:
+        list[int]: The distinct cells in their original order.
+    """
+    return list(dict.fromkeys(indices))
+
+
+def distinct_index_rows(rows):
+    """
+    Applies distinct_indices to every row of a batch of cells.
+
+    Args:
+        rows(numpy.ndarray): The cells of one element per row.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: The distinct cells of every element one after another and the
+            number of distinct cells of each element.
+    """
+    keep = np.ones(rows.shape, dtype=bool)
+    for column in range(1, rows.shape[1]):
+        keep[:, column] = (rows[:, :column] != rows[:, column:column + 1]).all(axis=1)
+    return rows[keep], keep.sum(axis=1)
+
+
+class FixedHashPolicy:
+    """
+    Hash count policy of a classic IBLT, every element is inserted into the cells of all k seeds.
+    The checksum stored in the hashSum field is a separate hash of the element under element_seed.
+    """
+
+    def __init__(self, seed_list, element_seed, hash_mode=HASH_MODE_SEEDED, distinct_cells=False):
+        """
+        Constructor
+
+        Args:
+            seed_list(list[int]): Seeds for the cell hashes, one per hash.
+            element_seed(int): Seed for the element hash stored in the hashSum field.
+            hash_mode(str): (Optional) HASH_MODE_SEEDED to hash once per seed, HASH_MODE_PARTITIONED to derive
+                one cell in each of k partitions of the table.
+            distinct_cells(bool): (Optional) Insert every element into each of its cells once, see
+                distinct_indices. Partitioned hashing always gives distinct cells.
+        """
+        self.seed_list = seed_list
+        self.element_seed = element_seed
+        self.hash_mode = hash_mode
+        self.distinct_cells = distinct_cells
+
+    def element_hash(self, key):
+        """
+        Hashes an encoded element into the 128 bit value its checksum is taken from.
+
+        Args:
+            key(bytes): The encoded element ID.
+
+        Returns:
+            int: The 128 bit hash.
+        """
+        return mmh3.hash128(key, self.element_seed)
+
+    def indices(self, key, item_hash, m):
+        """
+        Derives the cells of an element.
+
+        Args:
+            key(bytes): The encoded element ID.
+            item_hash(int): The hash returned by element_hash for the key.
+            m(int): Size of the IBLT.
+
+        Returns:
+            list[int]: The cells the element is inserted into.
+        """
+        indices = derive_indices(key, self.seed_list, m, self.hash_mode)
+        return distinct_indices(indices) if self.distinct_cells else indices
+
+    def index_array(self, keys, item_hashes, m):
+        """
+        Derives the cells of a batch of elements at once.
+
+        Args:
+            keys(list[bytes]): The encoded element IDs.
+            item_hashes(list[int]): The hashes returned by element_hash for the keys.
+            m(int): Size of the IBLT.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: The cells of every element one after another and the number of
+                cells of each element.
+        """
+        rows = derive_index_array(keys, self.seed_list, m, self.hash_mode)
+        if self.distinct_cells:
+            return distinct_index_rows(rows)
+        return rows.ravel(), np.full(len(rows), rows.shape[1], dtype=np.int64)
+
+    def mean_hashes(self):
+        """
+        Returns:
+            float: The mean number of cells an element is inserted into.
+        """
+        return len(self.seed_list)
+
+
+class DeciderHashPolicy:
+    """
+    Hash count policy of the randomized IBLTs, the hash of an element under the seed key both forms its checksum
+    and picks its number of hashes from the hash decider. A decider drawn uniformly gives the RIBLT, one drawn from
+    the ALOHA distribution gives the ALOHA IBLT, and any other degree distribution can be plugged in the same way.
+    """
+
+    def __init__(self, seed_key, seed_list, hash_decider, distinct_cells=False):
+        """
+        Constructor
+
+        Args:
+            seed_key(int): Shared key the element hash is seeded with.
+            seed_list(list[int]): Seeds for the cell hashes, at least as many as the largest hash count.
+            hash_decider(list[int]): The hash counts an element hash is mapped onto.
+            distinct_cells(bool): (Optional) Insert every element into each of its cells once, see
+                distinct_indices. An element then occupies fewer cells than its hash count when cells repeat.
+        """
+        self.seed_key = seed_key
+        self.seed_list = seed_list
+        self.hash_decider = hash_decider
+        self.distinct_cells = distinct_cells
+
+    def element_hash(self, key):
+        """
+        Hashes an encoded element into the 128 bit value its checksum and hash count are taken from.
+
+        Args:
+            key(bytes): The encoded element ID.
+
+        Returns:
+            int: The 128 bit hash.
+        """
+        return mmh3.hash128(key, self.seed_key)
+
+    def hash_quantity(self, item_hash):
+        """
+        Decides how many cells an element is inserted into.
+
+        Args:
+            item_hash(int): The hash returned by element_hash.
+
+        Returns:
+            int: The number of cells.
+        """
+        return self.hash_decider[item_hash % len(self.hash_decider)]
+
+    def indices(self, key, item_hash, m):
+        """
+        Derives the cells of an element.
+
+        Args:
+            key(bytes): The encoded element ID.
+            item_hash(int): The hash returned by element_hash for the key.
+            m(int): Size of the IBLT.
+
+        Returns:
+            list[int]: The cells the element is inserted into.
+        """
+        seed_list = self.seed_list
+        indices = [mmh3.hash128(key, seed_list[i]) % m for i in range(self.hash_quantity(item_hash))]
+        return distinct_indices(indices) if self.distinct_cells else indices
+
+    def index_array(self, keys, item_hashes, m):
+        """
+        Derives the cells of a batch of elements at once.
+
+        Args:
+            keys(list[bytes]): The encoded element IDs.
+            item_hashes(list[int]): The hashes returned by element_hash for the keys.
+            m(int): Size of the IBLT.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: The cells of every element one after another and the number of
+                cells of each element.
+        """
+        cells = [self.indices(key, item_hash, m) for key, item_hash in zip(keys, item_hashes)]
+        indices = [index for element_cells in cells for index in element_cells]
+        return np.array(indices, dtype=np.uint64), np.array([len(element_cells) for element_cells in cells],
+                                                             dtype=np.int64)
+
+    def mean_hashes(self):
+        """
+        Returns:
+            float: The mean number of cells an element is inserted into.
+        """
+        return sum(self.hash_decider) / len(self.hash_decider)
+
+
+class ThresholdDecider:
+    """
+    Maps element hashes straight onto hash counts through the inverse CDF of a degree distribution.
+    The high 64 bits of an element hash are read as a uniform value and binary searched in integer thresholds
+    scaled from the cumulative weights, so no per seed list of counts is kept and the counts follow the
+    distribution without the bias of reducing the hash modulo a short list.
+    """
+    HASH_BITS = 64
+
+    def __init__(self, values, cumulative):
+        """
+        Constructor
+
+        Args:
+            values(list[int]): The hash counts of the distribution.
+            cumulative(list[float]): The cumulative weight of each hash count, ending at 1.
+        """
+        scale = 1 << self.HASH_BITS
+        thresholds = []
+        highest = 0
+        # A running maximum keeps the thresholds sorted when a distribution has negative weights.
+        for weight in cumulative:
+            highest = max(highest, min(int(round(weight * scale)), scale))
+            thresholds.append(highest)
+        thresholds[-1] = scale
+        self.values = tuple(values)
+        self.thresholds = tuple(thresholds)
+
+    def quantity(self, item_hash):
+        """
+        Args:
+            item_hash(int): A 128 bit element hash.
+
+        Returns:
+            int: The hash count of the element.
+        """
+        return self.values[bisect_right(self.thresholds, item_hash >> self.HASH_BITS)]
+
+    def mean(self):
+        """
+        Returns:
+            float: The mean hash count under the distribution.
+        """
+        previous = 0
+        total = 0
+        for value, threshold in zip(self.values, self.thresholds):
+            total += value * (threshold - previous)
+            previous = threshold
+        return total / (1 << self.HASH_BITS)
+
+
+class ThresholdHashPolicy(DeciderHashPolicy):
+    """
+    Hash count policy of the randomized IBLTs with the hash count of an element taken from a ThresholdDecider
+    instead of a list of counts.
+    """
+
+    def hash_quantity(self, item_hash):
+        """
+        Decides how many cells an element is inserted into.
+
+        Args:
+            item_hash(int): The hash returned by element_hash.
+
+        Returns:
+            int: The number of cells.
+        """
+        return self.hash_decider.quantity(item_hash)
+
+    def mean_hashes(self):
+        """
+        Returns:
+            float: The mean number of cells an element is inserted into.
+        """
+        return self.hash_decider.mean()
+
+
+@lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+def cached_threshold_decider(values, cumulative):
+    """
+    ThresholdDecider of a hash count distribution, kept in a process wide LRU cache keyed by the distribution.
+    It depends only on the distribution, not the seed key, and replaces the hash decider list.
+
+    Args:
+        values(tuple[int]): The hash counts of the distribution.
+        cumulative(tuple[float]): The cumulative weight of each hash count, ending at 1.
+
+    Returns:
+        ThresholdDecider: The hash count thresholds.
+    """
+    return ThresholdDecider(values, cumulative)
+
+
+def default_hash_decider(decider_mode, distribution, table_decider):
+    """
+    Hash decider of a randomized IBLT used when none is passed in, RIBLT and the ALOHA IBLT only differ in the
+    distribution they pass in and how they draw a hash decider list from it.
+
+    Args:
+        decider_mode: DECIDER_TABLE for a list of hash counts indexed by the item hash, DECIDER_THRESHOLD to
+            map the item hash straight onto a hash count.
+        distribution(tuple[tuple[int], tuple[float]]): The hash counts and their cumulative weights.
+        table_decider(callable): Returns the cached hash decider list used in DECIDER_TABLE mode.
+
+    Returns:
+        tuple[int], ThresholdDecider: The hash decider.
+    """
+    if decider_mode not in DECIDER_MODES:
+        raise ValueError("Unknown decider mode %s, expected one of %s" % (decider_mode, DECIDER_MODES))
+    if decider_mode == DECIDER_TABLE:
+        return table_decider()
+    return cached_threshold_decider(*distribution)
+
+
+def generate_seed_list(seed_key, max_hashes=MAX_HASHES, seed_range=SEED_RANGE):
+    """
+    List of seeds to be used to derive the item locations in the randomized IBLTs.
+
+    Args:
+        seed_key: Shared key to instantiate hash functions.
+        max_hashes: Upper bound for total hashes to be used.
+        seed_range: Range of random numbers to be used to generate a new seed key if not specified.
+
+    Returns:
+        list[int]: A list of seed keys which are used to seed hash functions for item placement.
+    """
+    # A private generator seeded like the global one gives the same seeds without touching the random module.
+    rng = random.Random(seed_key)
+    seed_list = []
+    i = 0
+    while i < max_hashes:
+        chosen_seed = rng.randint(0, seed_range)
+        if chosen_seed not in seed_list:
+            seed_list.append(chosen_seed)
+            i += 1
+    return seed_list
+
+
+@lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+def cached_seed_list(seed_key, max_hashes=MAX_HASHES, seed_range=SEED_RANGE):
+    """
+    Seed list of generate_seed_list as an immutable tuple, kept in a process wide LRU cache keyed by the arguments
+    and shared by RIBLT and the ALOHA IBLT. Hits and misses are reported by cached_seed_list.cache_info().
+
+    Args:
+        seed_key: Shared key to instantiate hash functions, must be hashable.
+        max_hashes: Upper bound for total hashes to be used.
+        seed_range: Range of random numbers to be used to generate a new seed key if not specified.
+
+    Returns:
+        tuple[int]: The seeds used to seed hash functions for item placement.
+    """
+    return tuple(generate_seed_list(seed_key, max_hashes, seed_range))
+
+
+def decider_engine(seed_key, seed_list, hash_decider, key_encoding=KEY_ENCODING_STR, checksum_bytes=CHECKSUM_BYTES,
+                   distinct_cells=False):
+    """
+    Builds the IBLT engine of a randomized IBLT for the given seeds and hash decider.
+
+    Args:
+        seed_key: Shared key to instantiate hash functions.
+        seed_list: List of seed keys for hashing item ids.
+        hash_decider: List of random numbers for hashing iterations or a ThresholdDecider.
+        key_encoding: KEY_ENCODING_STR to hash the string of every ID, KEY_ENCODING_TYPED to hash integer IDs
+            as fixed width bytes.
+        checksum_bytes: Width in bytes of the hashSum checksum.
+        distinct_cells: Insert every element into each of its cells once, see distinct_indices.
+
+    Returns:
+        IBLTEngine: The engine, its policy maps each item onto a hash count through the hash decider.
+    """
+    if isinstance(hash_decider, ThresholdDecider):
+        policy = ThresholdHashPolicy(seed_key, seed_list, hash_decider, distinct_cells)
+    else:
+        policy = DeciderHashPolicy(seed_key, seed_list, hash_decider, distinct_cells)
+    return IBLTEngine(policy, key_encoding, checksum_bytes)
@@ -1,6 +1,9 @@
 # Created By Nick Huppert on 4/5/20.
-import mmh3
 import random
+from IBLT.columnar_table import ColumnarTable
+from IBLT.engine import IBLTEngine
+from IBLT.hash_policy import FixedHashPolicy
+from hashing import CHECKSUM_BYTES, HASH_MODE_PARTITIONED, HASH_MODE_SEEDED, KEY_ENCODING_STR, KEY_ENCODINGS
 
 
 class IBloomLT:
@@ -8,103 +11,190 @@ class IBloomLT:
     Simple implementation of an invertible bloom lookup table.
     The IBLT returned will have the format for a list of lists.
     Each list in an element, each element is of the form [idSum, hashSum, count]
+    Encoding and decoding run on an IBLTEngine with a fixed hash count policy.
     """
     _M = 20
     _K = 3
     SEED_RANGE = 1000000
+    BULK_BATCH_SIZE = 65536
+    # Double hashing only yields about m^2 / 4 distinct cell sets, so elements of a difference often share all
+    # their cells and can never be peeled. IBLTs use seeded or partitioned hashing instead.
+    HASH_MODES = (HASH_MODE_SEEDED, HASH_MODE_PARTITIONED)
 
-    def __init__(self, m=_M, k=_K, seed_list=None, single_hash=None):
+    def __init__(self, m=_M, k=_K, seed_list=None, single_hash=None, hash_mode=HASH_MODE_SEEDED,
+                 key_encoding=KEY_ENCODING_STR, columnar=False, checksum_bytes=CHECKSUM_BYTES,
+                 id_words=ColumnarTable.DEFAULT_ID_WORDS, distinct_cells=False):
         """
         Constructor
 
         Args:
             m(int): Size of bloom filter array.
             k(int): Number of unique hashing algorithms to use.
+            seed_list(list[int]): (Optional) Seeds for the hashing algorithm, one per hash.
+            single_hash(int): (Optional) Seed for the element hash stored in the hashSum field.
+            hash_mode(str): (Optional) HASH_MODE_SEEDED to hash once per seed, HASH_MODE_PARTITIONED to derive
+                one cell in each of k partitions of the table from a hash per four seeds.
+            key_encoding(str): (Optional) KEY_ENCODING_STR to hash the string of every ID, KEY_ENCODING_TYPED
+                to hash integer IDs as fixed width bytes.
+            columnar(bool): (Optional) Keep the table owned by this object as a ColumnarTable instead of a list.
+            checksum_bytes(int): (Optional) Width in bytes of the hashSum checksum, narrower checksums make
+                smaller tables. Each pure cell check is fooled with probability about 2^(-8 * checksum_bytes) * k / m,
+                see truncate_checksum.
+            id_words(int): (Optional) Number of 64 bit words per idSum of columnar tables, 1 for IDs below 2^64
+                or 2 for IDs below 2^128.
+            distinct_cells(bool): (Optional) Insert every item into each of its cells once. Seeded hashing can
+                give an item the same cell twice, such tables differ from those built without it.
         """
-        random.seed()
+        if hash_mode not in self.HASH_MODES:
+            raise ValueError("Unsupported IBLT hash mode %s, expected one of %s" % (hash_mode, self.HASH_MODES))
+        if key_encoding not in KEY_ENCODINGS:
+            raise ValueError("Unknown key encoding %s, expected one of %s" % (key_encoding, KEY_ENCODINGS))
+        rng = random.Random()
         if seed_list is None:
             self.seed_list = []
             for i in range(k):
-                self.seed_list.append(random.randint(0, self.SEED_RANGE))
+                self.seed_list.append(rng.randint(0, self.SEED_RANGE))
         else:
             self.seed_list = seed_list
         self.m = m
         if single_hash is None:
-            self.element_hash = random.randint(0, self.SEED_RANGE)
+            self.element_hash = rng.randint(0, self.SEED_RANGE)
         else:
             self.element_hash = single_hash
+        self.hash_mode = hash_mode
+        self.key_encoding = key_encoding
+        self.checksum_bytes = checksum_bytes
+        self.id_words = id_words
+        self.distinct_cells = distinct_cells
+        self.engine = IBLTEngine(FixedHashPolicy(self.seed_list, self.element_hash, hash_mode, distinct_cells),
+                                 key_encoding, checksum_bytes)
+        self.table = self._new_table(columnar)
 
-    def generate_table(self, item_ids):
+    def _new_table(self, columnar=False):
+        """
+        Creates an empty table with the parameters of this object.
+
+        Args:
+            columnar(bool): (Optional) Create a ColumnarTable instead of a list.
+
+        Returns:
+            list, ColumnarTable: An empty invertible bloom lookup table.
+        """
+        if columnar:
+            return ColumnarTable(self.m, self.id_words)
+        return [(0, 0, 0)] * self.m
+
+    def insert(self, item_id):
+        """
+        Inserts a single item into the table owned by this object, touching only its k cells.
+
+        Args:
+            item_id(int): The ID of the item to be inserted.
+        """
+        self.peel_element(item_id, self.table, -1)
+
+    def delete(self, item_id):
+        """
+        Deletes a single item from the table owned by this object, touching only its k cells.
+        Deleting an item which was never inserted leaves it in the table with a count of -1, which decodes
+        as an element of the other side.
+
+        Args:
+            item_id(int): The ID of the item to be deleted.
+        """
+        self.peel_element(item_id, self.table, 1)
+
+    def subtract(self, other):
+        """
+        Subtracts the table of another IBLT built with the same parameters from the table of this one.
+
+        Args:
+            other(IBloomLT): The IBLT to subtract.
+
+        Returns:
+            IBloomLT: A new IBLT owning the difference table, counts are positive for items only in this one.
+        """
+        if self.m != other.m or self.seed_list != other.seed_list or self.element_hash != other.element_hash \
+                or self.hash_mode != other.hash_mode or self.key_encoding != other.key_encoding \
+                or self.checksum_bytes != other.checksum_bytes or self.distinct_cells != other.distinct_cells:
+            raise ValueError("IBLTs must share size, seeds, hashing mode, key encoding, checksum width and distinct "
+                             "cells to be subtracted")
+        difference = IBloomLT(self.m, seed_list=self.seed_list, single_hash=self.element_hash,
+                              hash_mode=self.hash_mode, key_encoding=self.key_encoding,
+                              checksum_bytes=self.checksum_bytes, id_words=self.id_words,
+                              distinct_cells=self.distinct_cells)
+        difference.table = IBLTEngine.subtract(self.table, other.table)
+        return difference
+
+    def decode(self):
+        """
+        Decodes the table owned by this object, for instance one returned by subtract.
+        The table itself is left unchanged.
+
+        Returns:
+            DecodeResult:
+                The items with a positive count, the items with a negative count and a string to confirm if the
+                    decoding was successful.
+        """
+        return self.compare_tables(self.table, self._new_table(isinstance(self.table, ColumnarTable)))
+
+    def generate_table(self, item_ids, columnar=False):
         """
         Given a list of item IDs, generate a corresponding IBLT
         Args:
             item_ids(list): A list of IDs for items to be included in IBLT.
+            columnar(bool): (Optional) Build a ColumnarTable backed by NumPy arrays instead of a list.
 
         Returns:
-            list: An invertible bloom lookup table in format list of lists.
-        """
-        bloom = [(0, 0, 0)] * self.m
-        for item in item_ids:
-            hash_values = []
-            for seed in self.seed_list:
-                hash_values.append(mmh3.hash128(str(item).encode(), seed))
-            for hash_value in hash_values:
-                index = hash_value % self.m
-                id_sum = bloom[index][0] ^ item
-                if bloom[index][1] == 0:
-                    hash_sum = mmh3.hash128(str(item).encode(), self.element_hash)
-                else:
-                    hash_sum = bloom[index][1] ^ mmh3.hash128(str(item).encode(), self.element_hash)
-                count = bloom[index][2] + 1
-                bloom[index] = (id_sum, hash_sum, count)
-        return bloom
+            list, ColumnarTable: An invertible bloom lookup table in format list of lists.
+        """
+        return self.engine.encode(item_ids, self.m, columnar, self.id_words)
+
+    def generate_table_bulk(self, item_ids, batch_size=BULK_BATCH_SIZE):
+        """
+        Given a list of integer item IDs, generate a columnar IBLT in batches.
+        The cell indices and hashes for a whole batch are computed into arrays first, then folded into the
+        table with scatter XOR and add operations. The result is identical to generate_table(item_ids, columnar=True).
+
+        Args:
+            item_ids(list[int]): A list of non negative integer IDs below 2^(64 * id_words) to be included in the
+                IBLT.
+            batch_size(int): (Optional) Number of items hashed and scattered together.
+
+        Returns:
+            ColumnarTable: An invertible bloom lookup table backed by NumPy arrays.
+        """
+        return self.engine.encode_bulk(item_ids, self.m, batch_size, self.id_words)
+
+    def generate_table_parallel(self, item_ids, workers=None):
+        """
+        Given a list of integer item IDs, generate a columnar IBLT over a pool of worker processes.
+        Each worker bulk encodes one shard of the IDs from shared memory and the partial tables are merged.
+
+        Args:
+            item_ids(list[int]): A list of non negative integer IDs below 2^64 to be included in the IBLT.
+            workers(int): (Optional) Number of worker processes, defaults to the number of CPUs.
+
+        Returns:
+            ColumnarTable: An invertible bloom lookup table backed by NumPy arrays.
+        """
+        return self.engine.encode_parallel(item_ids, self.m, workers, self.id_words)
 
     def compare_tables(self, table1, table2):
         """
         Compares 2 IBLTs and attempts to return the symmetric difference.
+        Two ColumnarTables are subtracted with vectorized operations and decoded in columnar format.
         Args:
             table1: Invertible bloom filter 1
             table2: Invertible bloom filter 2
 
         Returns:
-            list list str:
+            DecodeResult:
                 The symmetric difference of the IBLTs, list 1 is the extra elements from filter 1,
                     list 2 is the extra elements from filter 2, and a string to confirm if the
-                    decoding was successful.
+                    decoding was successful, along with the residual cells left when decoding fails.
         """
-        if len(table1) != len(table2):
-            return False
-        m = len(table1)
-        table1_differences = []
-        table2_differences = []
-        table3 = [[0, 0, 0]] * m
-        # Generate symmetric difference table
-        for index in range(m):
-            id_sum = table1[index][0] ^ table2[index][0]
-            hash_sum = table1[index][1] ^ table2[index][1]
-            count = table1[index][2] - table2[index][2]
-            table3[index] = [id_sum, hash_sum, count]
-        decodable = True
-        while decodable is True:
-            decodable = False
-            for index in range(m):
-                quick_check_pass = False
-                element = table3[index]
-                if element[2] == 1 or element[2] == -1:
-                    element_hash = mmh3.hash128(str(element[0]).encode(), self.element_hash)
-                    if element_hash == element[1]:
-                        table3 = self.peel_element(element[0], table3, element[2])
-                        decodable = True
-                        if element[2] == 1:
-                            table1_differences.append(element)
-                        else:
-                            table2_differences.append(element)
-        success = "Success"
-        for index in range(m):
-            if table3[index][1] != 0:
-                success = "Failed"
-        # print("IBLT: %s" %success)
-        return table1_differences, table2_differences, success
+        return self.engine.decode(table1, table2)
 
     def peel_element(self, element_id, table, alteration):
         """
@@ -119,20 +209,7 @@ class IBloomLT:
             list:
                 An updated invertible bloom lookup table with the given element removed.
         """
-        hash_values = []
-        element_hash = mmh3.hash128(str(element_id).encode(), self.element_hash)
-        for seed in self.seed_list:
-            hash_values.append(mmh3.hash128(str(element_id).encode(), seed))
-        for hash_value in hash_values:
-            index = hash_value % self.m
-            id_sum = table[index][0] ^ element_id
-            if table[index][1] == 0:
-                hash_sum = element_hash
-            else:
-                hash_sum = table[index][1] ^ element_hash
-            count = table[index][2] - alteration
-            table[index] = (id_sum, hash_sum, count)
-        return table
+        return self.engine.peel(element_id, table, alteration)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+def _encode_shard(shared_name, length, start, stop, encode_shard, arguments):
+    """
+    Worker process entry point, encodes one slice of the shared item IDs.
+
+    Args:
+        shared_name(str): Name of the shared memory block holding the item IDs.
+        length(int): Total number of item IDs in the block.
+        start(int): First item ID of the shard.
+        stop(int): End of the shard, exclusive.
+        encode_shard(callable): Function taking a list of item IDs followed by arguments, returning a ColumnarTable.
+        arguments(tuple): Remaining arguments for encode_shard.
+
+    Returns:
+        ColumnarTable: The partial table of the shard.
+    """
+    shared = shared_memory.SharedMemory(name=shared_name)
+    try:
+        item_ids = np.ndarray((length,), dtype=np.uint64, buffer=shared.buf)[start:stop].tolist()
+    finally:
+        shared.close()
+    return encode_shard(item_ids, *arguments)
+
+
+def encode_parallel(item_ids, encode_shard, arguments=(), workers=None):
+    """
+    Encodes an IBLT over a process pool. The item IDs are placed in shared memory, each worker encodes one
+    contiguous shard and the partial tables are merged, cells combine with XOR and addition so the merged table
+    is identical to encoding every item in one process.
+
+    Args:
+        item_ids(list[int]): Non negative integer IDs below 2^64.
+        encode_shard(callable): Picklable function taking a list of item IDs followed by arguments,
+            returning a ColumnarTable.
+        arguments(tuple): Remaining arguments for encode_shard.
+        workers(int): Number of worker processes, defaults to the number of CPUs.
+
+    Returns:
+        ColumnarTable: The merged table.
+    """
+    item_ids = np.asarray(item_ids, dtype=np.uint64)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(item_ids)))
+    if workers == 1:
+        return encode_shard(item_ids.tolist(), *arguments)
+    shared = shared_memory.SharedMemory(create=True, size=item_ids.nbytes)
+    try:
+        np.ndarray(item_ids.shape, dtype=np.uint64, buffer=shared.buf)[:] = item_ids
+        bounds = np.linspace(0, len(item_ids), workers + 1, dtype=np.int64).tolist()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_encode_shard, shared.name, len(item_ids), bounds[shard], bounds[shard + 1],
+                                   encode_shard, arguments) for shard in range(workers)]
+            table = futures[0].result()
+            for future in futures[1:]:
+                table.merge(future.result())
+    finally:
+        shared.close()
+        shared.unlink()
+    return table
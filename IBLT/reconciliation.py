@@ -0,0 +1,90 @@
+import math
+from IBLT.decode_result import DecodeResult
+from IBLT.iblt import IBloomLT
+from IBLT.strata_estimator import StrataEstimator
+from hashing import HASH_MODE_SEEDED, KEY_ENCODING_STR
+
+
+class Reconciliation:
+    """
+    Multi round set reconciliation driver over IBloomLTs.
+    Every round side 1 sends a table of its items built with fresh seeds, side 2 builds its own table and folds in
+    the elements recovered by earlier rounds, adding those only side 1 holds and removing those only it holds, so
+    the difference left to decode is just the residual of the previous round. The next round uses new seeds with a
+    table at least as large as the residual needs, grown when a round recovers fewer elements than it left behind.
+    """
+    MAX_ROUNDS = 4
+    GROWTH_FACTOR = 2
+
+    @staticmethod
+    def residual_table(iblt, item_ids, recovered1, recovered2):
+        """
+        Builds the table of side 2 with the elements recovered so far folded in.
+
+        Args:
+            iblt(IBloomLT): The IBLT of the current round.
+            item_ids(list): The IDs of the items of side 2.
+            recovered1(list[tuple]): The elements recovered so far which only side 1 holds.
+            recovered2(list[tuple]): The elements recovered so far which only side 2 holds.
+
+        Returns:
+            list: A table which differs from the table of side 1 only in the elements not yet recovered.
+        """
+        table = iblt.generate_table(item_ids)
+        for element in recovered1:
+            table = iblt.peel_element(element[0], table, -1)
+        for element in recovered2:
+            table = iblt.peel_element(element[0], table, 1)
+        return table
+
+    @staticmethod
+    def reconcile(items1, items2, m, k=IBloomLT._K, max_rounds=MAX_ROUNDS, growth_factor=GROWTH_FACTOR,
+                  hash_mode=HASH_MODE_SEEDED, key_encoding=KEY_ENCODING_STR):
+        """
+        Recovers the symmetric difference of two sets of item IDs over as many rounds as it takes, up to max_rounds.
+
+        Args:
+            items1(list): The IDs of the items of side 1.
+            items2(list): The IDs of the items of side 2.
+            m(int): Size of the table of the first round, for instance from StrataEstimator.calculate_table_values.
+            k(int): Number of hashes per item.
+            max_rounds(int): Upper bound on the number of rounds.
+            growth_factor(float): How many times larger the next table is when a round makes little progress.
+            hash_mode(str): (Optional) Hashing mode of the tables.
+            key_encoding(str): (Optional) Key encoding of the tables.
+
+        Returns:
+            DecodeResult:
+                The elements only in side 1, the elements only in side 2 and "Success" or "Failed", with the
+                    number of rounds taken and the residual of the last round if it failed. Element IDs are the
+                    first field of every element.
+        """
+        recovered1 = []
+        recovered2 = []
+        items2_set = set(items2)
+        result = None
+        for decode_round in range(1, max_rounds + 1):
+            # Every round has fresh seeds, so its tables never need to match older ones and can use distinct cells.
+            iblt = IBloomLT(m, k, hash_mode=hash_mode, key_encoding=key_encoding, distinct_cells=True)
+            table1 = iblt.generate_table(items1)
+            table2 = Reconciliation.residual_table(iblt, items2, recovered1, recovered2)
+            result = iblt.compare_tables(table1, table2)
+            # Side 2 knows its own items, so the side of every element is taken from them rather than from the sign
+            # of its count.
+            for element in result[0] + result[1]:
+                if element[0] in items2_set:
+                    recovered2.append(element)
+                else:
+                    recovered1.append(element)
+            if result.success:
+                return DecodeResult(recovered1, recovered2, rounds=decode_round)
+            if k in StrataEstimator.PEELING_THRESHOLDS:
+                residual_size = StrataEstimator.calculate_table_values(result.remaining_estimate, k)["m"]
+            else:
+                residual_size = m
+            # The residual estimate runs low on stalled tables, so only a round which made good progress keeps its size.
+            if len(result[0]) + len(result[1]) >= result.remaining_estimate:
+                m = max(residual_size, m)
+            else:
+                m = max(residual_size, int(math.ceil(m * growth_factor)))
+        return DecodeResult(recovered1, recovered2, result.residual_cells, result.remaining_estimate, max_rounds)
@@ -0,0 +1,30 @@
+import numpy as np
+
+SAMPLER_LEGACY = "legacy"
+SAMPLER_INVERSE_CDF = "inverse_cdf"
+SAMPLERS = (SAMPLER_LEGACY, SAMPLER_INVERSE_CDF)
+
+
+def inverse_cdf_sample(values, cumulative, size, seed_value):
+    """
+    Draws values from a discrete distribution by inverse transform sampling.
+    Uniform samples from a NumPy Generator seeded with seed_value are located in the cumulative weights with a
+    binary search, each sample takes the first value whose cumulative weight reaches it. The running maximum of the
+    weights is searched so distributions with negative weights pick the same value as a linear scan would, and
+    samples beyond the last weight, left by rounding, take the last value.
+
+    Args:
+        values(list): The values of the distribution.
+        cumulative(list[float]): The cumulative weight of each value, ending at 1.
+        size(int): Number of samples.
+        seed_value(int): Non negative seed, the same seed always gives the same samples.
+
+    Returns:
+        list: The sampled values.
+    """
+    if len(values) == 0:
+        return []
+    thresholds = np.maximum.accumulate(np.asarray(cumulative, dtype=np.float64))
+    positions = np.searchsorted(thresholds, np.random.default_rng(seed_value).random(size), side="left")
+    np.minimum(positions, len(values) - 1, out=positions)
+    return np.asarray(values)[positions].tolist()
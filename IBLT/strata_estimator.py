@@ -0,0 +1,135 @@
+import math
+import mmh3
+import random
+from IBLT.iblt import IBloomLT
+from hashing import encode_key, HASH_MODE_SEEDED, KEY_ENCODING_STR
+
+
+class StrataEstimator:
+    """
+    Strata estimator for the size of the symmetric difference of two sets, following Eppstein et al.,
+    "What's the Difference? Efficient Set Reconciliation without Prior Context".
+    Every item is placed in stratum i with probability 2^-(i+1), counted by the trailing zeros of its hash, and each
+    stratum is a small IBloomLT. The strata of two estimators are subtracted and decoded from the sparsest down,
+    the first stratum which fails to decode is scaled up to estimate the remaining difference.
+    """
+    STRATA = 32
+    CELLS = 80
+    K = 4
+    SEED_RANGE = 1000000
+    # Cells needed per element for a table with k hashes to peel completely, 1 / c_k for large tables.
+    PEELING_THRESHOLDS = {3: 1.222, 4: 1.295, 5: 1.425, 6: 1.570, 7: 1.721}
+    SAFETY_FACTOR = 1.5
+    MINIMUM_TABLE_SIZE = 20
+
+    def __init__(self, strata=STRATA, cells=CELLS, k=K, seed_list=None, single_hash=None, stratum_seed=None,
+                 hash_mode=HASH_MODE_SEEDED, key_encoding=KEY_ENCODING_STR, columnar=False):
+        """
+        Constructor, estimators which are compared must be built with the same parameters and seeds.
+
+        Args:
+            strata(int): Number of strata, differences up to roughly cells * 2^strata can be estimated.
+            cells(int): Number of cells in the IBLT of each stratum.
+            k(int): Number of hashes per item in each stratum.
+            seed_list(list[int]): (Optional) Seeds for the cell hashes, shared by every stratum.
+            single_hash(int): (Optional) Seed for the element hash stored in the hashSum field.
+            stratum_seed(int): (Optional) Seed for the hash which assigns items to strata.
+            hash_mode(str): (Optional) Hashing mode of the stratum IBLTs.
+            key_encoding(str): (Optional) Key encoding of the stratum IBLTs.
+            columnar(bool): (Optional) Store the strata as ColumnarTables.
+        """
+        first = IBloomLT(cells, k, seed_list, single_hash, hash_mode, key_encoding, columnar)
+        self.strata = [first] + [IBloomLT(cells, k, first.seed_list, first.element_hash, hash_mode, key_encoding,
+                                          columnar) for i in range(strata - 1)]
+        if stratum_seed is None:
+            stratum_seed = random.Random().randint(0, self.SEED_RANGE)
+        self.stratum_seed = stratum_seed
+        self.key_encoding = key_encoding
+
+    def _stratum(self, item_id):
+        """
+        Finds the stratum of an item from the trailing zeros of its hash.
+
+        Args:
+            item_id(int): The ID of the item.
+
+        Returns:
+            int: The index of the stratum.
+        """
+        item_hash = mmh3.hash128(encode_key(item_id, self.key_encoding), self.stratum_seed)
+        if item_hash == 0:
+            return len(self.strata) - 1
+        return min((item_hash & -item_hash).bit_length() - 1, len(self.strata) - 1)
+
+    def insert(self, item_id):
+        """
+        Inserts a single item into its stratum.
+
+        Args:
+            item_id(int): The ID of the item to be inserted.
+        """
+        self.strata[self._stratum(item_id)].insert(item_id)
+
+    def insert_many(self, item_ids):
+        """
+        Inserts a number of items.
+
+        Args:
+            item_ids(iterable): The IDs of the items to be inserted.
+        """
+        for item_id in item_ids:
+            self.insert(item_id)
+
+    def delete(self, item_id):
+        """
+        Deletes a single item from its stratum.
+
+        Args:
+            item_id(int): The ID of the item to be deleted.
+        """
+        self.strata[self._stratum(item_id)].delete(item_id)
+
+    def estimate_difference(self, other):
+        """
+        Estimates the size of the symmetric difference between the items of this estimator and another.
+
+        Args:
+            other(StrataEstimator): An estimator built with the same parameters and seeds.
+
+        Returns:
+            int: The estimated number of items in exactly one of the two estimators.
+        """
+        if len(self.strata) != len(other.strata) or self.stratum_seed != other.stratum_seed:
+            raise ValueError("Strata estimators must share the number of strata and stratum seed to be compared")
+        count = 0
+        for level in range(len(self.strata) - 1, -1, -1):
+            extra1, extra2, success = self.strata[level].subtract(other.strata[level]).decode()
+            if success != "Success":
+                return 2 ** (level + 1) * count
+            count += len(extra1) + len(extra2)
+        return count
+
+    @staticmethod
+    def calculate_table_values(estimated_difference, max_hashes=None, safety_factor=SAFETY_FACTOR):
+        """
+        Given an estimated symmetric difference, calculate the size and hash count of the IBLTs to reconcile it with.
+        The table holds the difference at the peeling threshold of the hash count, scaled by a safety factor to
+        cover the error of the estimate, and never shrinks below MINIMUM_TABLE_SIZE cells. Without a hash count
+        the one from PEELING_THRESHOLDS giving the smallest table is chosen.
+
+        Args:
+            estimated_difference(int): The estimated number of differing items, as from estimate_difference.
+            max_hashes(int): (Optional) The number of hashes per item, or the upper bound for RIBLT and ALOHA
+                tables, for tables whose hash count is already fixed. One of PEELING_THRESHOLDS.
+            safety_factor(float): How much larger than the estimate the table is sized for.
+
+        Returns:
+            dict: A dictionary of the table size (m) and the number of hashes (max_hashes).
+        """
+        thresholds = StrataEstimator.PEELING_THRESHOLDS
+        if max_hashes is None:
+            max_hashes = min(thresholds, key=thresholds.get)
+        elif max_hashes not in thresholds:
+            raise ValueError("Hash quantity must be one of %s" % sorted(thresholds))
+        m = int(math.ceil(estimated_difference * safety_factor * thresholds[max_hashes]))
+        return {"m": max(m, StrataEstimator.MINIMUM_TABLE_SIZE), "max_hashes": max_hashes}
@@ -0,0 +1,322 @@
+import pickle
+import random
+import unittest
+from IBLT.iblt import IBloomLT
+from IBLT.columnar_table import ColumnarTable
+from IBLT.wire_format import WireFormat
+from IBLT.strata_estimator import StrataEstimator
+from IBLT.reconciliation import Reconciliation
+from IBLT.engine import IBLTEngine
+from IBLT.hash_policy import cached_threshold_decider, DeciderHashPolicy, ThresholdDecider, DECIDER_TABLE, \
+    DECIDER_THRESHOLD
+from hashing import HASH_MODE_DOUBLE, HASH_MODE_PARTITIONED, HASH_MODE_SEEDED, KEY_ENCODING_TYPED
+from Random_IBLT.random_iblt import RIBLT
+from ALOHA_IBLT.aloha_iblt import IBLT as ALOHA, Distribution as ALOHADistribution
+from Random_IBLT.distribution import Distribution as RandomDistribution
+
+
+class TestIBLT(unittest.TestCase):
+    test_data = [5, 9, 3245, 7653, 124, 8764, 2314, 7452, 234, 7453, 56437, 1]
+    test_data2 = [5, 9, 3245, 7653, 124, 8764, 2314, 7452, 234, 7453, 56437, 2, 6]
+
+    def check_decode(self, bloom_table):
+        table1 = bloom_table.generate_table(self.test_data)
+        table2 = bloom_table.generate_table(self.test_data2)
+        extra1, extra2, lookup_success = bloom_table.compare_tables(table1, table2)
+        assert lookup_success == "Success"
+        assert sorted(element[0] for element in extra1) == [1]
+        assert sorted(element[0] for element in extra2) == [2, 6]
+
+    def test_compare_tables(self):
+        self.check_decode(IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44))
+
+    def test_compare_tables_partitioned_hashing(self):
+        self.check_decode(IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44,
+                                   hash_mode=HASH_MODE_PARTITIONED))
+        with self.assertRaises(ValueError):
+            IBloomLT(m=30, k=3, hash_mode=HASH_MODE_DOUBLE)
+
+    def test_compare_tables_partitioned_hashing_load(self):
+        # 150 differences in 240 cells, where double hashing used to fail about half of the decodes.
+        failures = 0
+        for trial in range(20):
+            bloom_table = IBloomLT(m=240, k=3, seed_list=[11 + trial, 22 + trial, 33 + trial], single_hash=44,
+                                   hash_mode=HASH_MODE_PARTITIONED)
+            items1 = list(range(1000)) + list(range(10000 * trial, 10000 * trial + 75))
+            items2 = list(range(1000)) + list(range(10000 * trial + 5000, 10000 * trial + 5075))
+            extra1, extra2, lookup_success = bloom_table.compare_tables(bloom_table.generate_table(items1),
+                                                                        bloom_table.generate_table(items2))
+            if lookup_success != "Success" or sorted(element[0] for element in extra1) != items1[1000:] \
+                    or sorted(element[0] for element in extra2) != items2[1000:]:
+                failures += 1
+        assert failures <= 2
+
+    def test_compare_tables_typed_keys(self):
+        self.check_decode(IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44, key_encoding=KEY_ENCODING_TYPED))
+        for table_class in (RIBLT, ALOHA):
+            table1 = table_class.generate_table(self.test_data, 7, table_size=30, key_encoding=KEY_ENCODING_TYPED)[0]
+            table2 = table_class.generate_table(self.test_data2, 7, table_size=30, key_encoding=KEY_ENCODING_TYPED)[0]
+            extra1, extra2, lookup_success = table_class.compare_tables(table1, table2, 7,
+                                                                        key_encoding=KEY_ENCODING_TYPED)
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+
+    def test_compare_tables_large_difference(self):
+        bloom_table = IBloomLT(m=400, k=3, seed_list=[11, 22, 33], single_hash=44)
+        table1 = bloom_table.generate_table(list(range(0, 1000)))
+        table2 = bloom_table.generate_table(list(range(100, 1100)))
+        extra1, extra2, lookup_success = bloom_table.compare_tables(table1, table2)
+        assert lookup_success == "Success"
+        assert sorted(element[0] for element in extra1) == list(range(0, 100))
+        assert sorted(element[0] for element in extra2) == list(range(1000, 1100))
+        for table_class in (RIBLT, ALOHA):
+            table1 = table_class.generate_table(list(range(0, 1000)), 7, table_size=600, distinct_cells=True)[0]
+            table2 = table_class.generate_table(list(range(100, 1100)), 7, table_size=600, distinct_cells=True)[0]
+            extra1, extra2, lookup_success = table_class.compare_tables(table1, table2, 7, distinct_cells=True)
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1 + extra2) == list(range(0, 100)) + list(range(1000, 1100))
+
+    def test_distinct_cells(self):
+        bloom_table = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44)
+        distinct_table = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44, distinct_cells=True)
+        item = next(item for item in range(1000) if len(set(bloom_table.engine.derive(item, 30)[1])) < 3)
+        assert max(cell[2] for cell in bloom_table.generate_table([item])) == 2
+        assert max(cell[2] for cell in distinct_table.generate_table([item])) == 1
+        assert distinct_table.generate_table_bulk([item]).to_list() == distinct_table.generate_table([item])
+        with self.assertRaises(ValueError):
+            bloom_table.subtract(distinct_table)
+
+    def test_columnar_tables(self):
+        bloom_table = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44)
+        list_table = bloom_table.generate_table(self.test_data)
+        columnar_table = bloom_table.generate_table(self.test_data, columnar=True)
+        assert columnar_table.to_list() == list_table
+        assert ColumnarTable.from_list(list_table) == columnar_table
+        extra1, extra2, lookup_success = bloom_table.compare_tables(
+            columnar_table, bloom_table.generate_table(self.test_data2, columnar=True))
+        assert lookup_success == "Success"
+        assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+        narrow_table = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44, id_words=1)
+        narrow_columnar_table = narrow_table.generate_table(self.test_data, columnar=True)
+        assert narrow_columnar_table.id_sum.shape == (30, 1) and narrow_columnar_table.to_list() == list_table
+        assert narrow_table.generate_table_bulk(self.test_data) == narrow_columnar_table
+        assert narrow_table.compare_tables(narrow_columnar_table,
+                                           narrow_table.generate_table(self.test_data2, columnar=True))[2] == "Success"
+        for table_class in (RIBLT, ALOHA):
+            table1 = table_class.generate_table(self.test_data, 7, table_size=30, columnar=True, id_words=1)[0]
+            table2 = table_class.generate_table(self.test_data2, 7, table_size=30, columnar=True, id_words=1)[0]
+            assert table1.id_words == 1
+            assert table1.to_list() == table_class.generate_table(self.test_data, 7, table_size=30)[0]
+            extra1, extra2, lookup_success = table_class.compare_tables(table1, table2, 7)
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+
+    def test_incremental_updates(self):
+        for columnar in (False, True):
+            local = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44, columnar=columnar)
+            remote = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44, columnar=columnar)
+            for item in self.test_data + [77]:
+                local.insert(item)
+            local.delete(77)
+            for item in self.test_data2:
+                remote.insert(item)
+            assert local.table == local.generate_table(self.test_data, columnar=columnar)
+            extra1, extra2, lookup_success = local.subtract(remote).decode()
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1) == [1]
+            assert sorted(element[0] for element in extra2) == [2, 6]
+        with self.assertRaises(ValueError):
+            local.subtract(IBloomLT(m=30, k=3, seed_list=[11, 22, 34], single_hash=44))
+
+    def test_short_checksum(self):
+        wrong_results = 0
+        for trial in range(40):
+            bloom_table = IBloomLT(m=120, k=3, seed_list=[11 + trial, 22 + trial, 33 + trial], single_hash=44 + trial,
+                                   checksum_bytes=1)
+            items1 = list(range(100)) + list(range(1000 * trial + 200, 1000 * trial + 230))
+            items2 = list(range(100)) + list(range(1000 * trial + 500, 1000 * trial + 530))
+            extra1, extra2, lookup_success = bloom_table.compare_tables(bloom_table.generate_table(items1),
+                                                                        bloom_table.generate_table(items2))
+            if lookup_success == "Success" and (sorted(element[0] for element in extra1) != items1[100:]
+                                                or sorted(element[0] for element in extra2) != items2[100:]):
+                wrong_results += 1
+        assert wrong_results == 0
+
+    def test_wire_format(self):
+        local = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44, hash_mode=HASH_MODE_PARTITIONED)
+        for item in self.test_data:
+            local.insert(item)
+        data = WireFormat.dumps_iblt(local, checksum_bytes=4)
+        assert len(data) < 30 * 13 + 32
+        for columnar in (False, True):
+            received = WireFormat.loads_iblt(data, columnar)
+            assert received.checksum_bytes == 4 and received.hash_mode == HASH_MODE_PARTITIONED
+            assert WireFormat.loads_iblt(WireFormat.dumps_iblt(received)).table == \
+                WireFormat.loads_iblt(data).table
+            remote = IBloomLT(m=30, k=3, seed_list=[11, 22, 33], single_hash=44,
+                              hash_mode=HASH_MODE_PARTITIONED, columnar=columnar, checksum_bytes=4)
+            for item in self.test_data2:
+                remote.insert(item)
+            extra1, extra2, lookup_success = received.subtract(remote).decode()
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+        for table_class, scheme, parameters in (
+                (RIBLT, WireFormat.SCHEME_RIBLT, {"min_hashes": 2, "max_hashes": 15}),
+                (ALOHA, WireFormat.SCHEME_ALOHA, {"max_hashes": 15, "a_value": 0.0})):
+            parameters.update({"seed_key": 7, "hash_decider_length": 1000, "seed_range": 1000,
+                               "key_encoding": KEY_ENCODING_TYPED})
+            table1 = table_class.generate_table(self.test_data, table_size=30, **parameters)[0]
+            table2 = table_class.generate_table(self.test_data2, table_size=30, checksum_bytes=4, **parameters)[0]
+            loaded_scheme, loaded_parameters, table1 = WireFormat.loads(
+                WireFormat.dumps(table1, scheme, parameters, checksum_bytes=4))
+            assert loaded_scheme == scheme
+            assert loaded_parameters == dict(parameters, checksum_bytes=4, decider_mode=DECIDER_TABLE,
+                                             sampler=ALOHADistribution.SAMPLER_LEGACY, distinct_cells=False)
+            extra1, extra2, lookup_success = table_class.compare_tables(table1, table2, **loaded_parameters)
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+            for columnar in (False, True):
+                received = WireFormat.loads(WireFormat.dumps(table1, scheme, parameters, checksum_bytes=4), columnar)[2]
+                full_width_table = table_class.generate_table(self.test_data2, table_size=30, columnar=columnar,
+                                                              **parameters)[0]
+                extra1, extra2, lookup_success = table_class.compare_tables(received, full_width_table,
+                                                                            **loaded_parameters)
+                assert lookup_success == "Success"
+                assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+        parameters = {"seed_key": 7, "min_hashes": 2, "max_hashes": 15, "hash_decider_length": 1000,
+                      "seed_range": 1000, "key_encoding": KEY_ENCODING_TYPED, "decider_mode": DECIDER_THRESHOLD,
+                      "sampler": ALOHADistribution.SAMPLER_INVERSE_CDF, "distinct_cells": True}
+        table1 = RIBLT.generate_table(self.test_data, table_size=30, **parameters)[0]
+        table2 = RIBLT.generate_table(self.test_data2, table_size=30, **parameters)[0]
+        loaded_parameters, table1 = WireFormat.loads(WireFormat.dumps(table1, WireFormat.SCHEME_RIBLT, parameters))[1:]
+        assert loaded_parameters == dict(parameters, checksum_bytes=16)
+        extra1, extra2, lookup_success = RIBLT.compare_tables(table1, table2, **loaded_parameters)
+        assert lookup_success == "Success"
+        assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+        with self.assertRaises(ValueError):
+            WireFormat.dumps_iblt(local, table=[(1 << 70, 0, 1)] * 30)
+
+    def test_strata_estimator(self):
+        for difference, low, high in ((6, 12, 12), (1000, 1000, 4000)):
+            local = StrataEstimator(seed_list=[11, 22, 33, 44], single_hash=55, stratum_seed=66)
+            remote = StrataEstimator(seed_list=[11, 22, 33, 44], single_hash=55, stratum_seed=66)
+            local.insert_many(range(0, 5000))
+            remote.insert_many(range(difference, 5000 + difference))
+            assert low <= local.estimate_difference(remote) <= high
+        assert StrataEstimator.calculate_table_values(1000, 4) == {"m": 1943, "max_hashes": 4}
+        assert StrataEstimator.calculate_table_values(0)["m"] == StrataEstimator.MINIMUM_TABLE_SIZE
+        assert StrataEstimator.calculate_table_values(1000) == {"m": 1833, "max_hashes": 3}
+        with self.assertRaises(ValueError):
+            StrataEstimator.calculate_table_values(1000, 8)
+
+    def test_partial_decode(self):
+        bloom_table = IBloomLT(m=100, k=3, seed_list=[11, 22, 33], single_hash=44)
+        result = bloom_table.compare_tables(bloom_table.generate_table(range(0, 1000)),
+                                            bloom_table.generate_table(range(200, 1200)))
+        extra1, extra2, lookup_success = result
+        assert lookup_success == "Failed" and not result.success
+        assert result.residual_cells and result.remaining_estimate > 0
+        assert all(element[0] < 200 for element in extra1) and all(element[0] >= 1000 for element in extra2)
+        assert pickle.loads(pickle.dumps(result)).residual_cells == result.residual_cells
+        assert bloom_table.compare_tables(*[bloom_table.generate_table(self.test_data)] * 2).residual_cells == []
+
+    def test_decode_mismatched_policy(self):
+        items = list(range(0, 3000, 3))
+        table1 = RIBLT.generate_table(items, 7, table_size=200, decider_mode=DECIDER_THRESHOLD)[0]
+        table2 = RIBLT.generate_table(items[10:] + [1, 2, 4, 5], 7, table_size=200,
+                                      decider_mode=DECIDER_THRESHOLD)[0]
+        result = RIBLT.compare_tables(table1, table2, 7)
+        assert result[2] == "Failed" and result.residual_cells
+
+    def test_reconcile(self):
+        result = Reconciliation.reconcile(list(range(0, 2000)), list(range(100, 2100)), 60)
+        assert result.success and result.rounds > 1
+        assert sorted(element[0] for element in result[0]) == list(range(0, 100))
+        assert sorted(element[0] for element in result[1]) == list(range(2000, 2100))
+
+    def test_engine_policy(self):
+        engine = IBLTEngine(DeciderHashPolicy(7, RIBLT.generate_seed_list(7, 6, 1000), [3, 4, 6]))
+        table1 = engine.encode(self.test_data, 30)
+        assert engine.encode_bulk(self.test_data, 30) == engine.encode(self.test_data, 30, columnar=True)
+        assert table1 == RIBLT.generate_table(self.test_data, 7, table_size=30, max_hashes=6,
+                                              hash_decider=[3, 4, 6])[0]
+        extra1, extra2, lookup_success = engine.decode(table1, engine.encode(self.test_data2, 30))
+        assert lookup_success == "Success"
+        assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+
+    def test_parameter_cache(self):
+        for table_class in (RIBLT, ALOHA):
+            table_class.cached_seed_list.cache_clear()
+            table_class.cached_hash_decider.cache_clear()
+            table1, seed_list, hash_decider = table_class.generate_table(self.test_data, 7, table_size=30)
+            table2 = table_class.generate_table(self.test_data2, 7, table_size=30)[0]
+            assert list(seed_list) == table_class.generate_seed_list(7, table_class.MAX_HASHES, 1000)
+            assert type(hash_decider) == tuple and len(hash_decider) == table_class.MAX_RANDOM_HASHES
+            assert table_class.compare_tables(table1, table2, 7)[2] == "Success"
+            assert table_class.cached_seed_list.cache_info().misses == 1
+            assert table_class.cached_seed_list.cache_info().hits == 2
+            assert table_class.cached_hash_decider.cache_info().hits == 2
+
+    def test_threshold_decider(self):
+        for table_class, parameters in ((RIBLT, {"max_hashes": 40}), (ALOHA, {"max_hashes": 12, "a_value": 0})):
+            table1, seed_list, hash_decider = table_class.generate_table(
+                self.test_data, 7, table_size=60, decider_mode=DECIDER_THRESHOLD, **parameters)
+            table2 = table_class.generate_table(self.test_data2, 7, table_size=60, decider_mode=DECIDER_THRESHOLD,
+                                                **parameters)[0]
+            assert isinstance(hash_decider, ThresholdDecider)
+            extra1, extra2, lookup_success = table_class.compare_tables(table1, table2, 7,
+                                                                        decider_mode=DECIDER_THRESHOLD, **parameters)
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+        hash_decider = cached_threshold_decider(*RIBLT.hash_count_distribution(2, 5))
+        assert hash_decider.quantity(0) == 2 and hash_decider.quantity((1 << 128) - 1) == 5
+        assert hash_decider.mean() == 3.5
+        with self.assertRaises(ValueError):
+            RIBLT.generate_table(self.test_data, 7, decider_mode="unknown")
+
+    def test_inverse_cdf_sampler(self):
+        sampler = ALOHADistribution.SAMPLER_INVERSE_CDF
+        sequence = ALOHADistribution.create_randomly_generated_sequence(5000, 10, 0, 7, sampler)
+        assert sequence == ALOHADistribution.create_randomly_generated_sequence(5000, 10, 0, 7, sampler)
+        assert len(sequence) == 5000 and min(sequence) >= 2 and max(sequence) <= 10
+        assert sequence.count(2) > sequence.count(3) > sequence.count(10)
+        sequence = RandomDistribution.create_randomly_generated_sequence(5000, 3, 12, -1, 7, sampler)
+        assert len(sequence) == 5000 and min(sequence) == 3 and max(sequence) == 12
+        with self.assertRaises(ValueError):
+            ALOHADistribution.create_randomly_generated_sequence(10, 10, 0, 7, "unknown")
+        for table_class, parameters in ((RIBLT, {"max_hashes": 8}), (ALOHA, {"max_hashes": 8, "a_value": 0})):
+            table1, seed_list, hash_decider = table_class.generate_table(self.test_data, 7, table_size=30,
+                                                                         sampler=sampler, **parameters)
+            table2 = table_class.generate_table(self.test_data2, 7, table_size=30, sampler=sampler, **parameters)[0]
+            assert hash_decider != table_class.generate_table(self.test_data, 7, table_size=30, **parameters)[2]
+            extra1, extra2, lookup_success = table_class.compare_tables(table1, table2, 7, sampler=sampler,
+                                                                        **parameters)
+            assert lookup_success == "Success"
+            assert sorted(element[0] for element in extra1 + extra2) == [1, 2, 6]
+
+    def test_private_random_streams(self):
+        random.seed(3)
+        expected = [random.random() for i in range(3)]
+        random.seed(3)
+        seed_list = RIBLT.generate_seed_list(7)
+        ALOHA.generate_hash_decider(7, 10, 0, 100)
+        IBloomLT(m=10, k=3)
+        assert [random.random() for i in range(3)] == expected
+        random.seed(7)
+        assert seed_list[0] == random.randint(0, RIBLT.SEED_RANGE)
+
+    def test_generate_table_bulk(self):
+        for hash_mode, seed_list in ((HASH_MODE_SEEDED, [11, 22, 33]), (HASH_MODE_PARTITIONED, [11, 22, 33]),
+                                     (HASH_MODE_PARTITIONED, [11, 22, 33, 44, 55, 66])):
+            bloom_table = IBloomLT(m=50, k=len(seed_list), seed_list=seed_list, single_hash=44, hash_mode=hash_mode)
+            items = list(range(0, 300, 7)) + [(1 << 100) + 5]
+            bulk_table = bloom_table.generate_table_bulk(items, batch_size=16)
+            assert bulk_table == bloom_table.generate_table(items, columnar=True)
+
+    def test_generate_table_parallel(self):
+        items = list(range(0, 3000, 3))
+        bloom_table = IBloomLT(m=500, k=3, seed_list=[11, 22, 33], single_hash=44)
+        assert bloom_table.generate_table_parallel(items, workers=2) == bloom_table.generate_table_bulk(items)
+        for table_class in (RIBLT, ALOHA):
+            parallel_table = table_class.generate_table_parallel(items, 7, table_size=500, workers=2)[0]
+            assert parallel_table == table_class.generate_table(items, 7, table_size=500, columnar=True)[0]
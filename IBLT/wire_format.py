@@ -0,0 +1,264 @@
+# Compact binary serialization of IBLT tables for reconciliation.
+import struct
+import numpy as np
+from IBLT.columnar_table import ColumnarTable
+from IBLT.hash_policy import DECIDER_MODES, DECIDER_TABLE
+from IBLT.iblt import IBloomLT
+from IBLT.sampling import SAMPLER_LEGACY, SAMPLERS
+from hashing import truncate_checksum, CHECKSUM_BYTES, HASH_MODES, KEY_ENCODINGS
+
+
+class WireFormat:
+    """
+    Compact binary format for IBloomLT, RIBLT and ALOHA IBLT tables sent between replicas.
+    A header holds the scheme, the column widths, the table size and the parameters needed to decode, followed by
+    the idSum column at a fixed width, the hashSum column truncated to the checksum width and the counts as
+    zigzag varints, so most counts take a single byte.
+    """
+    MAGIC = b"IBLW"
+    VERSION = 3
+    SCHEME_IBLOOMLT = 0
+    SCHEME_RIBLT = 1
+    SCHEME_ALOHA = 2
+    ID_BYTES = 8
+    MAX_COLUMN_BYTES = 16
+    # magic, version, scheme, id bytes, checksum bytes
+    _HEADER = struct.Struct("<4sBBBB")
+    _FLOAT = struct.Struct("<d")
+    # The parameters stored in the header of each scheme, in order, with how they are encoded.
+    _FIELDS = {
+        SCHEME_IBLOOMLT: (("seed_list", "list"), ("single_hash", "int"), ("hash_mode", "hash_mode"),
+                          ("key_encoding", "key_encoding"), ("distinct_cells", "bool")),
+        SCHEME_RIBLT: (("seed_key", "int"), ("min_hashes", "int"), ("max_hashes", "int"),
+                       ("hash_decider_length", "int"), ("seed_range", "int"), ("key_encoding", "key_encoding"),
+                       ("decider_mode", "decider_mode"), ("sampler", "sampler"), ("distinct_cells", "bool")),
+        SCHEME_ALOHA: (("seed_key", "int"), ("max_hashes", "int"), ("a_value", "float"),
+                       ("hash_decider_length", "int"), ("seed_range", "int"), ("key_encoding", "key_encoding"),
+                       ("decider_mode", "decider_mode"), ("sampler", "sampler"), ("distinct_cells", "bool")),
+    }
+    _CHOICES = {"hash_mode": HASH_MODES, "key_encoding": KEY_ENCODINGS, "decider_mode": DECIDER_MODES,
+                "sampler": SAMPLERS, "bool": (False, True)}
+    # Fields added after version 1, with the version they were added in and the value tables of earlier versions
+    # were built with, which is also used when the field is missing.
+    _ADDED_FIELDS = {"decider_mode": (2, DECIDER_TABLE), "sampler": (2, SAMPLER_LEGACY), "distinct_cells": (3, False)}
+
+    @staticmethod
+    def _write_varint(buffer, value):
+        """
+        Appends a signed integer to a buffer as a zigzag encoded varint.
+
+        Args:
+            buffer(bytearray): The buffer to append to.
+            value(int): The integer to write.
+        """
+        value = value << 1 if value >= 0 else ((-value) << 1) - 1
+        while value > 0x7F:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    @staticmethod
+    def _read_varint(data, offset):
+        """
+        Reads a zigzag encoded varint.
+
+        Args:
+            data(bytes): The serialized data.
+            offset(int): Position of the varint.
+
+        Returns:
+            tuple[int, int]: The integer and the position after it.
+        """
+        value = 0
+        shift = 0
+        while True:
+            if offset >= len(data):
+                raise ValueError("Truncated varint in IBLT data")
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), offset
+
+    @staticmethod
+    def dumps(table, scheme, parameters, id_bytes=ID_BYTES, checksum_bytes=CHECKSUM_BYTES):
+        """
+        Serializes a table and its decoding parameters.
+
+        Args:
+            table(list, ColumnarTable): The IBLT.
+            scheme(int): SCHEME_IBLOOMLT, SCHEME_RIBLT or SCHEME_ALOHA.
+            parameters(dict): The parameters listed in _FIELDS for the scheme, named as the keyword arguments of
+                the IBloomLT constructor or of compare_tables. A checksum_bytes entry gives the width the table
+                was built with, decider_mode, sampler and distinct_cells default to DECIDER_TABLE,
+                SAMPLER_LEGACY and False.
+            id_bytes(int): Width in bytes of every idSum, every ID in the table must fit.
+            checksum_bytes(int): Width in bytes hashSum values are truncated to. Tables loaded with a narrower
+                width than they were built with are decoded with that width.
+
+        Returns:
+            bytes: The serialized table.
+        """
+        if scheme not in WireFormat._FIELDS:
+            raise ValueError("Unknown IBLT scheme %s" % scheme)
+        checksum_bytes = min(checksum_bytes, parameters.get("checksum_bytes", CHECKSUM_BYTES))
+        if not 0 < id_bytes <= WireFormat.MAX_COLUMN_BYTES or not 0 < checksum_bytes <= WireFormat.MAX_COLUMN_BYTES:
+            raise ValueError("Column widths must be between 1 and %s bytes" % WireFormat.MAX_COLUMN_BYTES)
+        data = bytearray(WireFormat._HEADER.pack(WireFormat.MAGIC, WireFormat.VERSION, scheme, id_bytes,
+                                                 checksum_bytes))
+        m = len(table)
+        WireFormat._write_varint(data, m)
+        for name, kind in WireFormat._FIELDS[scheme]:
+            if name not in parameters and name not in WireFormat._ADDED_FIELDS:
+                raise ValueError("Missing parameter %s for IBLT scheme %s" % (name, scheme))
+            value = parameters[name] if name in parameters else WireFormat._ADDED_FIELDS[name][1]
+            if kind == "list":
+                WireFormat._write_varint(data, len(value))
+                for item in value:
+                    WireFormat._write_varint(data, item)
+            elif kind == "float":
+                data += WireFormat._FLOAT.pack(value)
+            elif kind in WireFormat._CHOICES:
+                data.append(WireFormat._CHOICES[kind].index(value))
+            elif type(value) != int:
+                raise ValueError("Parameter %s must be an integer to be serialized" % name)
+            else:
+                WireFormat._write_varint(data, value)
+        if isinstance(table, ColumnarTable):
+            # Words are little-endian and least significant first, so the bytes of a row are the integer.
+            id_column = table.id_sum.astype("<u8").view(np.uint8).reshape(m, -1)
+            if id_column[:, id_bytes:].any():
+                raise ValueError("An idSum does not fit in %s bytes" % id_bytes)
+            hash_column = table.hash_sum.astype("<u8").view(np.uint8).reshape(m, -1)
+            data += np.ascontiguousarray(id_column[:, :id_bytes]).tobytes()
+            data += np.ascontiguousarray(hash_column[:, :checksum_bytes]).tobytes()
+            counts = table.count.tolist()
+        else:
+            try:
+                data += b"".join(cell[0].to_bytes(id_bytes, "little") for cell in table)
+            except OverflowError:
+                raise ValueError("An idSum does not fit in %s bytes" % id_bytes)
+            data += b"".join(truncate_checksum(cell[1], checksum_bytes).to_bytes(checksum_bytes, "little")
+                             for cell in table)
+            counts = [cell[2] for cell in table]
+        for count in counts:
+            WireFormat._write_varint(data, count)
+        return bytes(data)
+
+    @staticmethod
+    def loads(data, columnar=False, id_words=ColumnarTable.DEFAULT_ID_WORDS):
+        """
+        Deserializes a table written by dumps, tables of earlier versions are read with the defaults of the
+        fields added since.
+
+        Args:
+            data(bytes): The serialized table.
+            columnar(bool): (Optional) Return a ColumnarTable instead of a list.
+            id_words(int): (Optional) Number of 64 bit words per idSum of a ColumnarTable, to match the tables it
+                will be compared with. Must hold the serialized idSum width.
+
+        Returns:
+            tuple[int, dict, list]:
+                The scheme, the parameters including checksum_bytes, and the table. For RIBLT and ALOHA tables
+                the parameters are keyword arguments of compare_tables.
+        """
+        if len(data) < WireFormat._HEADER.size:
+            raise ValueError("Data is too short to hold an IBLT")
+        magic, version, scheme, id_bytes, checksum_bytes = WireFormat._HEADER.unpack_from(data)
+        if magic != WireFormat.MAGIC:
+            raise ValueError("Data does not hold a serialized IBLT")
+        if not 1 <= version <= WireFormat.VERSION:
+            raise ValueError("Unsupported IBLT format version %s" % version)
+        if scheme not in WireFormat._FIELDS:
+            raise ValueError("Unknown IBLT scheme %s" % scheme)
+        offset = WireFormat._HEADER.size
+        m, offset = WireFormat._read_varint(data, offset)
+        parameters = {}
+        for name, kind in WireFormat._FIELDS[scheme]:
+            if name in WireFormat._ADDED_FIELDS and version < WireFormat._ADDED_FIELDS[name][0]:
+                value = WireFormat._ADDED_FIELDS[name][1]
+            elif kind == "list":
+                length, offset = WireFormat._read_varint(data, offset)
+                value = []
+                for i in range(length):
+                    item, offset = WireFormat._read_varint(data, offset)
+                    value.append(item)
+            elif kind == "float":
+                value = WireFormat._FLOAT.unpack_from(data, offset)[0]
+                offset += WireFormat._FLOAT.size
+            elif kind in WireFormat._CHOICES:
+                value = WireFormat._CHOICES[kind][data[offset]]
+                offset += 1
+            else:
+                value, offset = WireFormat._read_varint(data, offset)
+            parameters[name] = value
+        parameters["checksum_bytes"] = checksum_bytes
+        id_end = offset + m * id_bytes
+        hash_end = id_end + m * checksum_bytes
+        if len(data) < hash_end:
+            raise ValueError("Truncated IBLT data")
+        counts = []
+        position = hash_end
+        for i in range(m):
+            count, position = WireFormat._read_varint(data, position)
+            counts.append(count)
+        if columnar:
+            if id_bytes > 8 * id_words:
+                raise ValueError("An idSum of %s bytes does not fit in %s words" % (id_bytes, id_words))
+            table = ColumnarTable(m, id_words)
+            id_column = np.zeros((m, 8 * table.id_words), dtype=np.uint8)
+            id_column[:, :id_bytes] = np.frombuffer(data, np.uint8, m * id_bytes, offset).reshape(m, id_bytes)
+            table.id_sum[:] = id_column.view("<u8")
+            hash_column = np.zeros((m, 8 * table.HASH_WORDS), dtype=np.uint8)
+            hash_column[:, :checksum_bytes] = np.frombuffer(data, np.uint8, m * checksum_bytes,
+                                                            id_end).reshape(m, checksum_bytes)
+            table.hash_sum[:] = hash_column.view("<u8")
+            table.count[:] = counts
+        else:
+            table = [(int.from_bytes(data[offset + index * id_bytes:offset + (index + 1) * id_bytes], "little"),
+                      int.from_bytes(data[id_end + index * checksum_bytes:id_end + (index + 1) * checksum_bytes],
+                                     "little"),
+                      counts[index]) for index in range(m)]
+        return scheme, parameters, table
+
+    @staticmethod
+    def dumps_iblt(iblt, table=None, id_bytes=ID_BYTES, checksum_bytes=CHECKSUM_BYTES):
+        """
+        Serializes an IBloomLT table together with the parameters of the IBloomLT.
+
+        Args:
+            iblt(IBloomLT): The IBLT whose parameters are written.
+            table(list, ColumnarTable): (Optional) The table to write, defaults to the table owned by iblt.
+            id_bytes(int): Width in bytes of every idSum.
+            checksum_bytes(int): Width in bytes hashSum values are truncated to.
+
+        Returns:
+            bytes: The serialized table.
+        """
+        parameters = {"seed_list": iblt.seed_list, "single_hash": iblt.element_hash, "hash_mode": iblt.hash_mode,
+                      "key_encoding": iblt.key_encoding, "checksum_bytes": iblt.checksum_bytes,
+                      "distinct_cells": iblt.distinct_cells}
+        return WireFormat.dumps(iblt.table if table is None else table, WireFormat.SCHEME_IBLOOMLT, parameters,
+                                id_bytes, checksum_bytes)
+
+    @staticmethod
+    def loads_iblt(data, columnar=False, id_words=ColumnarTable.DEFAULT_ID_WORDS):
+        """
+        Deserializes an IBloomLT written by dumps_iblt.
+
+        Args:
+            data(bytes): The serialized table.
+            columnar(bool): (Optional) Own a ColumnarTable instead of a list.
+            id_words(int): (Optional) Number of 64 bit words per idSum of a ColumnarTable.
+
+        Returns:
+            IBloomLT: An IBLT with the serialized parameters owning the serialized table.
+        """
+        scheme, parameters, table = WireFormat.loads(data, columnar, id_words)
+        if scheme != WireFormat.SCHEME_IBLOOMLT:
+            raise ValueError("Data holds an IBLT of scheme %s, not an IBloomLT" % scheme)
+        iblt = IBloomLT(len(table), len(parameters["seed_list"]), columnar=columnar, id_words=id_words, **parameters)
+        iblt.table = table
+        return iblt
@@ -1,5 +1,5 @@
 # Created By Nick Huppert on 13/5/20.
-from random_iblt import RIBLT
+from Random_IBLT.random_iblt import RIBLT
 import random
 from random import randint
 
@@ -1,11 +1,16 @@
 # Created By Nick Huppert on 20/7/20.
 import math
+import random
 from random import randint, seed
+from IBLT.sampling import inverse_cdf_sample, SAMPLER_INVERSE_CDF, SAMPLER_LEGACY, SAMPLERS
 
 
 class Distribution:
 
     MAXIMUM_ACCURACY = 10000000
+    SAMPLER_LEGACY = SAMPLER_LEGACY
+    SAMPLER_INVERSE_CDF = SAMPLER_INVERSE_CDF
+    SAMPLERS = SAMPLERS
 
     @staticmethod
     def create_poisson_distribution(minimum, average):
@@ -35,14 +40,21 @@ class Distribution:
         return distributions
 
     @staticmethod
-    def create_randomly_generated_sequence(size, minimum, maximum, a_value, seed_value):
+    def create_randomly_generated_sequence(size, minimum, maximum, a_value, seed_value, sampler=SAMPLER_LEGACY):
         if maximum <= minimum:
             return None
         distribution_list = Distribution.create_aloha_style_distribution(a_value, (maximum-minimum)+1)
-        seed(seed_value)
+        # The inverse CDF sampler draws the whole sequence at once, deterministic per seed but unlike the legacy one.
+        if sampler == Distribution.SAMPLER_INVERSE_CDF:
+            return inverse_cdf_sample([value - 2 + minimum for value, weight in distribution_list],
+                                      [weight for value, weight in distribution_list], size, seed_value)
+        if sampler != Distribution.SAMPLER_LEGACY:
+            raise ValueError("Unknown sampler %s, expected one of %s" % (sampler, Distribution.SAMPLERS))
+        # Drawn from a private generator, which repeats the sequence of the seeded global one.
+        rng = random.Random(seed_value)
         hash_list = []
         for i in range(0, size):
-            random_number = randint(0, Distribution.MAXIMUM_ACCURACY)
+            random_number = rng.randint(0, Distribution.MAXIMUM_ACCURACY)
             random_number = random_number/Distribution.MAXIMUM_ACCURACY
             for j in range(0, len(distribution_list)):
                 if random_number <= distribution_list[j][1]:
@@ -0,0 +1,219 @@
+# Shared index derivation for bloom filters and IBLTs.
+import mmh3
+import numpy as np
+
+HASH_MODE_SEEDED = "seeded"
+HASH_MODE_DOUBLE = "double"
+HASH_MODE_PARTITIONED = "partitioned"
+HASH_MODES = (HASH_MODE_SEEDED, HASH_MODE_DOUBLE, HASH_MODE_PARTITIONED)
+
+_LOW_64_MASK = (1 << 64) - 1
+_PARTITION_BITS = 32
+_PARTITION_MASK = (1 << _PARTITION_BITS) - 1
+_PARTITIONS_PER_HASH = 128 // _PARTITION_BITS
+
+
+def seeded_indices(key, seeds, m):
+    """
+    Derives one index per seed, hashing the key once for every seed.
+
+    Args:
+        key(bytes): The encoded item.
+        seeds(list[int]): Seeds for the hashing algorithm, one per index.
+        m(int): Size of the array being indexed.
+
+    Returns:
+        list[int]: The derived indices.
+    """
+    return [mmh3.hash128(key, seed) % m for seed in seeds]
+
+
+def double_hash_indices(key, seed, k, m):
+    """
+    Derives k indices from a single 128 bit hash using Kirsch-Mitzenmacher double hashing.
+    The hash is split into two 64 bit halves h1 and h2, index i is (h1 + i * h2) mod m.
+    The low bit of h2 is forced on so the step can never be zero.
+
+    Args:
+        key(bytes): The encoded item.
+        seed(int): Seed for the single hash.
+        k(int): Number of indices to derive.
+        m(int): Size of the array being indexed.
+
+    Returns:
+        list[int]: The derived indices.
+    """
+    hash_value = mmh3.hash128(key, seed)
+    h1 = hash_value & _LOW_64_MASK
+    h2 = (hash_value >> 64) | 1
+    return [(h1 + i * h2) % m for i in range(k)]
+
+
+def partition_bounds(m, k):
+    """
+    Splits an array into k partitions of nearly equal size.
+
+    Args:
+        m(int): Size of the array, at least k.
+        k(int): Number of partitions.
+
+    Returns:
+        list[tuple[int, int]]: The start and size of every partition.
+    """
+    if m < k:
+        raise ValueError("Partitioned hashing needs at least one cell per hash, got %s cells for %s hashes" % (m, k))
+    return [(i * m // k, (i + 1) * m // k - i * m // k) for i in range(k)]
+
+
+def partitioned_indices(key, seeds, m):
+    """
+    Derives one index inside each of k partitions of the array.
+    Every 128 bit hash is cut into four independent 32 bit words, one per partition, so an item needs one hash
+    for every four indices. Unlike double hashing the indices are independent and always distinct, so two items
+    rarely share all of their cells, which an IBLT needs to peel them.
+
+    Args:
+        key(bytes): The encoded item.
+        seeds(list[int]): Seeds for the hashing algorithm, one per index, one hash is taken per four seeds.
+        m(int): Size of the array being indexed, at least len(seeds).
+
+    Returns:
+        list[int]: The derived indices, index i lies in partition i.
+    """
+    indices = []
+    hash_value = 0
+    for i, (start, size) in enumerate(partition_bounds(m, len(seeds))):
+        if i % _PARTITIONS_PER_HASH == 0:
+            hash_value = mmh3.hash128(key, seeds[i])
+        else:
+            hash_value >>= _PARTITION_BITS
+        indices.append(start + (hash_value & _PARTITION_MASK) % size)
+    return indices
+
+
+def derive_indices(key, seeds, m, hash_mode=HASH_MODE_SEEDED):
+    """
+    Derives the array indices for a key using the given hashing mode.
+
+    Args:
+        key(bytes): The encoded item.
+        seeds(list[int]): Seeds for the hashing algorithm, double hashing only uses the first seed.
+        m(int): Size of the array being indexed.
+        hash_mode(str): HASH_MODE_SEEDED for one hash per seed, HASH_MODE_DOUBLE for double hashing,
+            HASH_MODE_PARTITIONED for one independent index per partition.
+
+    Returns:
+        list[int]: One index per seed.
+    """
+    if hash_mode == HASH_MODE_SEEDED:
+        return seeded_indices(key, seeds, m)
+    if hash_mode == HASH_MODE_DOUBLE:
+        if len(seeds) == 0:
+            return []
+        return double_hash_indices(key, seeds[0], len(seeds), m)
+    if hash_mode == HASH_MODE_PARTITIONED:
+        return partitioned_indices(key, seeds, m)
+    raise ValueError("Unknown hash mode %s, expected one of %s" % (hash_mode, HASH_MODES))
+
+
+def derive_index_array(keys, seeds, m, hash_mode=HASH_MODE_SEEDED):
+    """
+    Derives the array indices for a batch of keys at once, matching derive_indices for every key.
+    Double hashing is computed on the whole batch as ((h1 mod m) + i * (h2 mod m)) mod m in uint64, which equals
+    (h1 + i * h2) mod m as long as m * k stays below 2^64.
+
+    Args:
+        keys(list[bytes]): The encoded items.
+        seeds(list[int]): Seeds for the hashing algorithm, double hashing only uses the first seed.
+        m(int): Size of the array being indexed.
+        hash_mode(str): HASH_MODE_SEEDED, HASH_MODE_DOUBLE or HASH_MODE_PARTITIONED.
+
+    Returns:
+        numpy.ndarray: A uint64 array of shape (len(keys), len(seeds)).
+    """
+    indices = np.empty((len(keys), len(seeds)), dtype=np.uint64)
+    if len(keys) == 0 or len(seeds) == 0:
+        return indices
+    if hash_mode == HASH_MODE_SEEDED:
+        for column, seed in enumerate(seeds):
+            indices[:, column] = [mmh3.hash128(key, seed) % m for key in keys]
+    elif hash_mode == HASH_MODE_DOUBLE:
+        hash_values = [mmh3.hash128(key, seeds[0]) for key in keys]
+        h1 = np.array([(hash_value & _LOW_64_MASK) % m for hash_value in hash_values], dtype=np.uint64)
+        h2 = np.array([((hash_value >> 64) | 1) % m for hash_value in hash_values], dtype=np.uint64)
+        steps = np.arange(len(seeds), dtype=np.uint64)
+        np.remainder(h1[:, None] + steps[None, :] * h2[:, None], np.uint64(m), out=indices)
+    elif hash_mode == HASH_MODE_PARTITIONED:
+        hash_values = []
+        for column, (start, size) in enumerate(partition_bounds(m, len(seeds))):
+            if column % _PARTITIONS_PER_HASH == 0:
+                hash_values = [mmh3.hash128(key, seeds[column]) for key in keys]
+            else:
+                hash_values = [hash_value >> _PARTITION_BITS for hash_value in hash_values]
+            words = np.array([hash_value & _PARTITION_MASK for hash_value in hash_values], dtype=np.uint64)
+            indices[:, column] = np.uint64(start) + words % np.uint64(size)
+    else:
+        raise ValueError("Unknown hash mode %s, expected one of %s" % (hash_mode, HASH_MODES))
+    return indices
+
+
+KEY_ENCODING_STR = "str"
+KEY_ENCODING_TYPED = "typed"
+KEY_ENCODINGS = (KEY_ENCODING_STR, KEY_ENCODING_TYPED)
+
+CHECKSUM_BYTES = 16
+
+_UINT64_LIMIT = 1 << 64
+_UINT128_LIMIT = 1 << 128
+
+
+def encode_key(item, key_encoding=KEY_ENCODING_STR):
+    """
+    Encodes an item into the bytes which are hashed.
+    KEY_ENCODING_STR hashes the decimal string of every item, the original behaviour.
+    KEY_ENCODING_TYPED hashes non negative integers below 2^64 as 8 little-endian bytes and those below
+    2^128 as 16 bytes, passes bytes through unchanged and falls back to the string for anything else.
+
+    Args:
+        item: The item to encode.
+        key_encoding(str): KEY_ENCODING_STR or KEY_ENCODING_TYPED.
+
+    Returns:
+        bytes: The encoded item.
+    """
+    if key_encoding == KEY_ENCODING_TYPED:
+        item_type = type(item)
+        if item_type is int:
+            if 0 <= item < _UINT64_LIMIT:
+                return item.to_bytes(8, "little")
+            if 0 <= item < _UINT128_LIMIT:
+                return item.to_bytes(16, "little")
+        elif item_type is bytes:
+            return item
+        elif item_type is bytearray or item_type is memoryview:
+            return bytes(item)
+        elif item_type is str:
+            return item.encode()
+    elif key_encoding != KEY_ENCODING_STR:
+        raise ValueError("Unknown key encoding %s, expected one of %s" % (key_encoding, KEY_ENCODINGS))
+    return str(item).encode()
+
+
+def truncate_checksum(hash_value, checksum_bytes=CHECKSUM_BYTES):
+    """
+    Truncates a 128 bit hash to the low checksum_bytes bytes stored in the hashSum field of an IBLT.
+    Narrower checksums shrink the table at the cost of a higher chance of mistaking a mixed cell for a pure one.
+    A mixed cell matches a checksum of b bytes with probability 2^(-8b), and decoding only peels it when the
+    element it poses as also maps back to the cell, about k / m of the time. A wrong peel leaves cells behind
+    and the decode reports "Failed", so 1 byte checksums mostly cost failed decodes rather than wrong results.
+
+    Args:
+        hash_value(int): The 128 bit hash.
+        checksum_bytes(int): Width of the checksum in bytes, between 1 and 16.
+
+    Returns:
+        int: The truncated hash.
+    """
+    if checksum_bytes >= CHECKSUM_BYTES:
+        return hash_value
+    return hash_value & ((1 << (8 * checksum_bytes)) - 1)
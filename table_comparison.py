@@ -1,4 +1,6 @@
 import json
+import queue
+import sys
 from datetime import datetime
 from pprint import pprint
 
@@ -16,6 +18,8 @@ DEFAULT_BLOOM_SIZE = .7
 DEFAULT_REPS = 10
 DEFAULT_A_VALUE = 0.0
 DEFAULT_MAX_HASHES = 10
+DEFAULT_WORKERS = None
+PROGRESS_INTERVAL = 100
 
 test_number = 0
 
@@ -99,16 +103,37 @@ def verify_results(test_data, result):
 def test(reps=DEFAULT_REPS, test_size=DEFAULT_TEST_SIZE, bloom_size=DEFAULT_BLOOM_SIZE,
          sym_difference=DEFAULT_SYMMETRIC_DIFFERENCE, a_value=DEFAULT_A_VALUE,
          max_hashes=DEFAULT_MAX_HASHES, only_test_aloha=False, label_name=None, test_iteration=0):
+    store_results(run_test(reps, test_size, bloom_size, sym_difference, a_value, max_hashes, only_test_aloha),
+                  label_name, test_iteration)
+
+
+def store_results(results, label_name, test_iteration):
+    """
+    Stores the results of one test cell in results_dictionary.
+
+    Args:
+        results: The results of each table as returned by run_test.
+        label_name: The test the cell belongs to, such as "mega_test".
+        test_iteration: The number of the cell within the test.
+    """
+    for table in results.keys():
+        results_dictionary[table][str(label_name)][test_iteration] = results[table]
+
+
+def run_test(reps=DEFAULT_REPS, test_size=DEFAULT_TEST_SIZE, bloom_size=DEFAULT_BLOOM_SIZE,
+             sym_difference=DEFAULT_SYMMETRIC_DIFFERENCE, a_value=DEFAULT_A_VALUE,
+             max_hashes=DEFAULT_MAX_HASHES, only_test_aloha=False):
+    """
+    Runs the repetitions of one test cell without touching any shared state, so cells can run in other processes.
+
+    Returns:
+        dict: The averaged timings, success rate and parameters of each table tested.
+    """
     # Bloom Table: Create time, compare time, success count, [success messages]
     counters = {"IBLT": [0, 0, 0, []],
                 "RIBLT": [0, 0, 0, []],
                 "ALOHA": [0, 0, 0, []]}
-    label_name = str(label_name)
-
-    if aloha_only is False:
-        results_dictionary["IBLT"][label_name][test_iteration] = {}
-        results_dictionary["RIBLT"][label_name][test_iteration] = {}
-    results_dictionary["ALOHA"][label_name][test_iteration] = {}
+    cell_results = {}
 
     for i in range(0, reps):
         # print("Iteration %s" % str(i))
@@ -188,15 +213,80 @@ def test(reps=DEFAULT_REPS, test_size=DEFAULT_TEST_SIZE, bloom_size=DEFAULT_BLOO
     for table in counters.keys():
         if only_test_aloha and table != "ALOHA":
             continue
-        results_dictionary[table][label_name][test_iteration]["set_size"] = test_size
-        results_dictionary[table][label_name][test_iteration]["average_creation_time"] = counters[table][0] / reps
-        results_dictionary[table][label_name][test_iteration]["average_comparison_time"] = counters[table][1] / reps
-        results_dictionary[table][label_name][test_iteration]["success_rate"] = counters[table][2] / reps
-        results_dictionary[table][label_name][test_iteration]["filter_size"] = bloom_size
-        results_dictionary[table][label_name][test_iteration]["symmetric_difference"] = sym_difference
-        results_dictionary[table][label_name][test_iteration]["a_value"] = a_value
-        results_dictionary[table][label_name][test_iteration]["max_hashes"] = max_hashes
-        results_dictionary[table][label_name][test_iteration]["success_messages"] = counters[table][3].copy()
+        cell_results[table] = {}
+        cell_results[table]["set_size"] = test_size
+        cell_results[table]["average_creation_time"] = counters[table][0] / reps
+        cell_results[table]["average_comparison_time"] = counters[table][1] / reps
+        cell_results[table]["success_rate"] = counters[table][2] / reps
+        cell_results[table]["filter_size"] = bloom_size
+        cell_results[table]["symmetric_difference"] = sym_difference
+        cell_results[table]["a_value"] = a_value
+        cell_results[table]["max_hashes"] = max_hashes
+        cell_results[table]["success_messages"] = counters[table][3].copy()
+    return cell_results
+
+
+def mega_test_grid(table_size_minmax=(34, 75, 2), symmetric_difference_minmax=(30, 55, 2),
+                   max_hash_values=(3, 4, 5, 6, 7, 8, 9, 10), a_value_minmax=(-100, 101, 5), reps=5, test_size=500):
+    """
+    Lists the cells of the mega_test grid as independent tasks, numbered in the order of the serial loops.
+    Only the first a value of every combination tests IBLT and RIBLT as well, which ignore the a value.
+
+    Args:
+        table_size_minmax: Range of bloom sizes in percent of the set size.
+        symmetric_difference_minmax: Range of symmetric differences in percent of the set size.
+        max_hash_values: Maximum hash counts to test.
+        a_value_minmax: Range of a values in tenths.
+        reps: Repetitions of every cell.
+        test_size: Size of the sets compared.
+
+    Returns:
+        generator: (test_iteration, keyword arguments of run_test) for every cell.
+    """
+    test_iteration = 0
+    for bl_size in range(table_size_minmax[0], table_size_minmax[1], table_size_minmax[2]):
+        for sym_diff in range(symmetric_difference_minmax[0], symmetric_difference_minmax[1],
+                              symmetric_difference_minmax[2]):
+            for max_hash in max_hash_values:
+                for a_val in range(a_value_minmax[0], a_value_minmax[1], a_value_minmax[2]):
+                    test_iteration += 1
+                    yield test_iteration, {"reps": reps, "test_size": test_size, "bloom_size": bl_size / 100,
+                                           "sym_difference": sym_diff / 100, "a_value": a_val / 10,
+                                           "max_hashes": max_hash, "only_test_aloha": a_val != a_value_minmax[0]}
+
+
+def _run_task(test_iteration, parameters):
+    return test_iteration, run_test(**parameters)
+
+
+def run_sweep(tasks, label_name, workers=DEFAULT_WORKERS, progress_interval=PROGRESS_INTERVAL):
+    """
+    Runs independent test cells on a pool of worker processes.
+    Every finished cell is put on a queue by its future and the calling thread drains the queue into
+    results_dictionary as cells complete, so the store keeps a single writer whatever the completion order.
+
+    Args:
+        tasks: (test_iteration, keyword arguments of run_test) for every cell, such as mega_test_grid().
+        label_name: The test the cells belong to, such as "mega_test".
+        workers: Number of worker processes, defaults to the number of CPUs.
+        progress_interval: Number of completed cells between progress messages.
+
+    Returns:
+        int: The number of cells run.
+    """
+    result_queue = queue.Queue()
+    with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        submitted = 0
+        for test_iteration, parameters in tasks:
+            executor.submit(_run_task, test_iteration, parameters).add_done_callback(result_queue.put)
+            submitted += 1
+        for completed in range(1, submitted + 1):
+            # result() raises in this thread if the cell failed in its worker.
+            test_iteration, results = result_queue.get().result()
+            store_results(results, label_name, test_iteration)
+            if completed % progress_interval == 0:
+                print("%s of %s tests complete at %s" % (str(completed), str(submitted), str(datetime.now())))
+    return submitted
 
 
 def generate_test_data(quantity=DEFAULT_TEST_SIZE, symmetric_difference=DEFAULT_SYMMETRIC_DIFFERENCE):
@@ -263,34 +353,12 @@ if __name__ == '__main__':
         #     with open("test_data.json", "w") as dump_data:
         #         dump_data.write(json.dumps(results_dictionary))
 
-        test_number = 0
         test_name = "mega_test"
         print(datetime.now())
 
-        table_size_minmax = (34, 75, 2)
-        symmetric_difference_minmax = (30, 55, 2)
-
-        for bl_size in range(table_size_minmax[0], table_size_minmax[1], table_size_minmax[2]):
-            for sym_diff in range(symmetric_difference_minmax[0], symmetric_difference_minmax[1],
-                                  symmetric_difference_minmax[2]):
-                for max_hash in [3, 4, 5, 6, 7, 8, 9, 10]:  # range(3, 50, 2):
-                    for a_val in range(-100, 101, 5):
-                        test_number += 1
-                        if a_val == a_value_minmax[0]:
-                            aloha_only = False
-                        else:
-                            aloha_only = True
-                        if test_number % 100 == 0:
-                            print("Test %s starting" % str(test_number))
-                        test(reps=5, test_size=500, bloom_size=bl_size / 100, sym_difference=sym_diff / 100,
-                             a_value=a_val / 10, max_hashes=max_hash, only_test_aloha=aloha_only, label_name=test_name,
-                             test_iteration=test_number)
-                print("One max_hash test set for sym diff value %s has completed at %s" %
-                      (str(sym_diff), str(datetime.now())))
-            print("One sym_diff test set for bl size value %s has completed at %s" %
-                  (str(bl_size), str(datetime.now())))
-            print("Tests %%%s complete" % str(100 * (bl_size - (table_size_minmax[0] - table_size_minmax[2])) /
-                                              (table_size_minmax[1] - table_size_minmax[0])))
+        # The worker count can be given as the first argument, it defaults to the number of CPUs.
+        workers = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_WORKERS
+        run_sweep(mega_test_grid(), test_name, workers)
         with open("test_data_mega.json", "w") as dump_data:
             dump_data.write(json.dumps(results_dictionary))
 